@@ -0,0 +1,27 @@
+"""reminder due indexes
+
+Revision ID: 7f3c2a91d4e6
+Revises: 5e738203eb7d
+Create Date: 2026-10-18 11:02:41.306518
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '7f3c2a91d4e6'
+down_revision = '5e738203eb7d'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # the delivery poll: enabled reminders with time in a range. id rides along in the index, so it's covering
+    op.create_index('reminders_due', 'reminders', ['enabled', 'time'])
+    # look, offset and del: a channel's reminders in time order
+    op.create_index('reminders_channel_due', 'reminders', ['channel_id', 'enabled', 'time'])
+
+
+def downgrade():
+    op.drop_index('reminders_channel_due', 'reminders')
+    op.drop_index('reminders_due', 'reminders')
@@ -0,0 +1,47 @@
+"""todo positions
+
+Revision ID: a4d19e0c6b52
+Revises: 7f3c2a91d4e6
+Create Date: 2026-10-18 14:26:09.581204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4d19e0c6b52'
+down_revision = '7f3c2a91d4e6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('todos', sa.Column('position', mysql.INTEGER(unsigned=True), nullable=False, server_default='0'))
+
+    # number the existing items of each list in the order they were added
+    op.execute('''
+        UPDATE todos
+        JOIN (SELECT id, ROW_NUMBER() OVER (PARTITION BY user_id, guild_id ORDER BY id) AS n FROM todos) numbered
+            ON todos.id = numbered.id
+        SET todos.position = numbered.n
+    ''')
+
+    # the default was only there to add the column to existing rows
+    op.alter_column('todos', 'position', existing_type=mysql.INTEGER(unsigned=True), existing_nullable=False,
+                    server_default=None)
+
+    # every list is owned by either a user or a guild, so neither key has two items at the same position
+    op.create_unique_constraint('todos_user_position', 'todos', ['user_id', 'position'])
+    op.create_unique_constraint('todos_guild_position', 'todos', ['guild_id', 'position'])
+
+
+def downgrade():
+    # mysql drops the foreign keys' own indexes once these cover them, so they're put back first
+    op.create_index('todos_user', 'todos', ['user_id'])
+    op.create_index('todos_guild', 'todos', ['guild_id'])
+
+    op.drop_constraint('todos_guild_position', 'todos', type_='unique')
+    op.drop_constraint('todos_user_position', 'todos', type_='unique')
+    op.drop_column('todos', 'position')
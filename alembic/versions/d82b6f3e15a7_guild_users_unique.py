@@ -0,0 +1,31 @@
+"""guild users unique
+
+Revision ID: d82b6f3e15a7
+Revises: a4d19e0c6b52
+Create Date: 2026-10-18 17:48:33.120947
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'd82b6f3e15a7'
+down_revision = 'a4d19e0c6b52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # the table has no key to tell duplicates apart by, so keep one copy of each pair aside and put those back
+    op.execute('CREATE TEMPORARY TABLE guild_users_distinct AS SELECT DISTINCT guild, user FROM guild_users')
+    op.execute('DELETE FROM guild_users')
+    op.execute('INSERT INTO guild_users (guild, user) SELECT guild, user FROM guild_users_distinct')
+    op.execute('DROP TEMPORARY TABLE guild_users_distinct')
+
+    op.create_unique_constraint('guild_user', 'guild_users', ['guild', 'user'])
+
+
+def downgrade():
+    # mysql drops the guild foreign key's own index once the unique key covers it, so it's put back first
+    op.create_index('guild_users_guild', 'guild_users', ['guild'])
+    op.drop_constraint('guild_user', 'guild_users', type_='unique')
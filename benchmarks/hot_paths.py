@@ -0,0 +1,222 @@
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+import timeit
+import types
+import typing
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BOT_ID = 349920059549941761
+
+# a rough mix of what the bot sees in a guild: mostly chat, some of it starting with a prefix-like character
+MESSAGES = [
+    'hello everyone',
+    'has anyone seen the new patch notes? apparently they changed how the scheduler works again',
+    'lol',
+    '!play never gonna give you up',
+    '$remind 1h take the bins out',
+    '$r 10m check the oven',
+    '<@{}> help'.format(BOT_ID),
+    '<@!{}> look 10'.format(BOT_ID),
+    '$look enabled',
+    '$todo add finish the report',
+    '$$$$$$ not a command',
+    ':)',
+]
+
+EXPLICIT_TIMES = ['12:30', '25/12', '25/12/2027-09:00', '14:00:30', '1/1-0:00', '31/12/2030-23:59:59']
+DISPLACEMENT_TIMES = ['1h', '30m', '1d12h', '90', '-5m', '2h30m15s', '10s', '7d']
+
+
+def prepare_database() -> str:
+    # without BOT_DATABASE_URL the models are pointed at a throwaway SQLite file holding an english strings table, so
+    # the suite runs anywhere without a MySQL server
+    if 'BOT_DATABASE_URL' not in os.environ:
+        path = os.path.join(tempfile.mkdtemp(prefix='reminder-bench-'), 'bench.db')
+
+        connection = sqlite3.connect(path)
+        connection.execute('CREATE TABLE languages (id INTEGER PRIMARY KEY, name VARCHAR(20), code VARCHAR(2))')
+        connection.execute("INSERT INTO languages (name, code) VALUES ('English', 'EN')")
+        connection.execute('CREATE TABLE strings (id INTEGER PRIMARY KEY, name TEXT, value_EN TEXT)')
+        connection.executemany('INSERT INTO strings (name, value_EN) VALUES (?, ?)',
+                               [('look/inter', 'at'), ('look/listing', 'Listing reminders')] +
+                               [('bench/{}'.format(n), 'String number {}'.format(n)) for n in range(600)])
+        connection.commit()
+        connection.close()
+
+        # the bot's database executor uses the connection from its own thread
+        os.environ['BOT_DATABASE_URL'] = 'sqlite:///{}?check_same_thread=false'.format(path)
+
+        # the embeds table uses a MySQL only integer type
+        from sqlalchemy.dialects.mysql import MEDIUMINT
+        from sqlalchemy.ext.compiler import compiles
+
+        compiles(MEDIUMINT, 'sqlite')(lambda element, compiler, **kw: 'INTEGER')
+
+    return os.environ['BOT_DATABASE_URL'].split(':', 1)[0]
+
+
+def build_benchmarks() -> typing.Dict[str, typing.Callable[[], object]]:
+    sys.path.insert(0, ROOT)
+
+    import discord
+    import pytz
+
+    from enums import PermissionLevels
+    from main import BotClient, command_pattern, command_table, del_line, look_line, paginate
+    from models import Reminder, strings_catalog
+    from passers import Command
+    from time_extractor import TimeExtractor
+
+    strings_catalog.reload()
+    english = strings_catalog.language('EN')
+
+    now = time.time()
+    timezone = pytz.timezone('Europe/London')
+
+    pattern = command_pattern(BOT_ID, command_table(BotClient).keys())
+
+    command = Command('remind', None, True, PermissionLevels.MANAGED)
+    restrictions = {role: {'remind', 'look', 'del'} for role in range(50)}
+    member = types.SimpleNamespace(
+        guild_permissions=types.SimpleNamespace(manage_messages=False, manage_guild=False),
+        roles=[types.SimpleNamespace(id=role) for role in range(45, 65)])
+    manager = types.SimpleNamespace(
+        guild_permissions=types.SimpleNamespace(manage_messages=True, manage_guild=True), roles=[])
+
+    names = ['bench/{}'.format(n) for n in range(0, 600, 60)]
+
+    reminders = [(n, 'Reminder number {} with a little text'.format(n), int(now) + n * 600, n % 7 != 0, 10 ** 17 + n)
+                 for n in range(300)]
+    todos = ['\n{}: {}'.format(n, 'something that needs doing ' * 3) for n in range(1, 101)]
+
+    def explicit():
+        for string in EXPLICIT_TIMES:
+            TimeExtractor(string, 'Europe/London').extract_exact(now)
+
+    def displacement():
+        for string in DISPLACEMENT_TIMES:
+            TimeExtractor(string, 'Europe/London').extract_displacement(now)
+
+    def command_regex():
+        for content in MESSAGES:
+            pattern.match(content)
+
+    def get_string():
+        for name in names:
+            english.get_string(name)
+
+    def look_render():
+        return list(paginate(look_line(content, 'at', reminder_time, timezone, enabled)
+                             for _, content, reminder_time, enabled, _ in reminders))
+
+    def del_render():
+        return list(paginate(del_line(count, content, channel)
+                             for count, (_, content, _, _, channel) in enumerate(reminders, start=1)))
+
+    def todo_render():
+        return [discord.Embed(title='Your TODO', description=page).to_dict() for page in paginate(todos, 2048)]
+
+    return {
+        'time_extractor.explicit': explicit,
+        'time_extractor.displacement': displacement,
+        'on_message.command_regex': command_regex,
+        'check_permissions.managed': lambda: command.check_permissions(member, restrictions),
+        'check_permissions.manager': lambda: command.check_permissions(manager, restrictions),
+        'reminder.create_uid': Reminder.create_uid,
+        'language.get_string': get_string,
+        'look.render': look_render,
+        'del.render': del_render,
+        'todo.render': todo_render,
+    }
+
+
+def measure(func: typing.Callable[[], object], repeats: int) -> dict:
+    timer = timeit.Timer(func)
+    # enough calls per run to take at least 0.2s, so timer resolution doesn't matter
+    number, _ = timer.autorange()
+
+    runs = [total / number * 1e6 for total in timer.repeat(repeat=repeats, number=number)]
+
+    return {
+        'best_us': min(runs),
+        'median_us': statistics.median(runs),
+        'number': number,
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> typing.List[str]:
+    regressions: typing.List[str] = []
+
+    print('{:<30} {:>12} {:>12} {:>8}'.format('benchmark', 'baseline', 'current', 'ratio'))
+
+    for name, result in results['results'].items():
+        previous = baseline['results'].get(name)
+
+        if previous is None:
+            print('{:<30} {:>12} {:>10.2f}us {:>8}'.format(name, '-', result['best_us'], 'new'))
+            continue
+
+        ratio = result['best_us'] / previous['best_us']
+
+        print('{:<30} {:>10.2f}us {:>10.2f}us {:>7.2f}x{}'.format(
+            name, previous['best_us'], result['best_us'], ratio, '  REGRESSED' if ratio > 1 + threshold else ''))
+
+        if ratio > 1 + threshold:
+            regressions.append(name)
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time the pure hot paths of the bot')
+    parser.add_argument('--output', help='file to write the JSON results to')
+    parser.add_argument('--baseline', help='results from an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='fraction slower than the baseline a benchmark may be before it counts as a regression')
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--only', help='only run benchmarks whose name contains this')
+    args = parser.parse_args()
+
+    dialect = prepare_database()
+
+    results = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'database': dialect,
+        'time': int(time.time()),
+        'results': {},
+    }
+
+    for name, func in build_benchmarks().items():
+        if args.only is not None and args.only not in name:
+            continue
+
+        results['results'][name] = measure(func, args.repeats)
+        print('{:<30} {:>10.2f}us'.format(name, results['results'][name]['best_us']))
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+        print()
+        regressions = compare(results, baseline, args.threshold)
+
+        if regressions:
+            print('\n{} benchmark(s) regressed by more than {:.0%}'.format(len(regressions), args.threshold))
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
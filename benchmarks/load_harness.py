@@ -0,0 +1,366 @@
+import argparse
+import asyncio
+import contextvars
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import socket
+import sys
+import tempfile
+import time
+import typing
+
+from hot_paths import ROOT, prepare_database
+
+# drives BotClient.on_message with generated guild traffic, with every REST call the bot makes answered by a stub
+# server in another process. nothing connects to discord, so it can be run as hard as the machine allows
+
+API = '/api/v7'
+
+BOT_USER = {'id': '349920059549941761', 'username': 'Reminder Bot', 'discriminator': '0001', 'avatar': None,
+            'bot': True, 'verified': True, 'mfa_enabled': False}
+
+# every permission except administrator, so members can use MANAGED and RESTRICTED commands
+PERMISSIONS = 0x7ffffff7
+
+# (content, weight). {n} is filled with a random number so reminders don't all land on the same second
+COMMANDS = [
+    ('$help', 3),
+    ('$remind {n}m harness reminder', 3),
+    ('$r {n}h something else', 1),
+    ('<@349920059549941761> look', 2),
+    ('$look enabled', 1),
+    ('$todo', 1),
+    ('$todo add water the plants', 1),
+    ('$clock', 1),
+    ('$info', 1),
+    ('$natural in {n} minutes stretch', 1),
+]
+
+CHAT = [
+    'hello everyone',
+    'has anyone seen the new patch notes? apparently they changed how the scheduler works again',
+    'lol',
+    '!play never gonna give you up',
+    'ok see you tomorrow',
+    '$$$ not for us',
+]
+
+
+def run_stub(port: int, ready):
+    from aiohttp import web
+
+    ids = itertools.count(10 ** 18)
+    counts: typing.Dict[str, int] = {}
+
+    def count(name: str):
+        counts[name] = counts.get(name, 0) + 1
+
+    def respond(data, status: int = 200):
+        # discord.py only decodes a body whose content type is exactly application/json, with no charset
+        return web.Response(body=json.dumps(data).encode(), status=status, headers={'content-type': 'application/json'})
+
+    async def me(_request):
+        count('users/@me')
+        return respond(BOT_USER)
+
+    async def create_dm(request):
+        count('create_dm')
+        recipient = (await request.json())['recipient_id']
+
+        return respond({
+            'id': str(next(ids)), 'type': 1,
+            'recipients': [{'id': str(recipient), 'username': 'user', 'discriminator': '0001', 'avatar': None}]})
+
+    async def send_message(request):
+        count('send_message')
+        body = await request.json()
+
+        return respond({
+            'id': str(next(ids)), 'channel_id': request.match_info['channel'], 'type': 0,
+            'content': body.get('content') or '', 'author': BOT_USER, 'attachments': [],
+            'embeds': [body['embed']] if body.get('embed') else [], 'mentions': [], 'mention_roles': [],
+            'pinned': False, 'mention_everyone': False, 'tts': False,
+            'timestamp': '2020-01-01T00:00:00+00:00', 'edited_timestamp': None})
+
+    async def create_webhook(request):
+        count('create_webhook')
+
+        return respond({
+            'id': str(next(ids)), 'type': 1, 'token': 'stub', 'name': 'Reminders', 'avatar': None,
+            'channel_id': request.match_info['channel'], 'guild_id': None})
+
+    async def execute_webhook(_request):
+        count('execute_webhook')
+        return web.Response(status=204)
+
+    async def stats(_request):
+        return respond(counts)
+
+    async def unhandled(request):
+        count('unhandled {} {}'.format(request.method, request.path))
+        return respond({'message': 'not stubbed', 'code': 0}, 404)
+
+    app = web.Application()
+    app.add_routes([
+        web.get(API + '/users/@me', me),
+        web.post(API + '/users/@me/channels', create_dm),
+        web.post(API + '/channels/{channel}/messages', send_message),
+        web.post(API + '/channels/{channel}/webhooks', create_webhook),
+        web.post(API + '/webhooks/{id}/{token}', execute_webhook),
+        web.get('/stats', stats),
+        web.route('*', '/{tail:.*}', unhandled),
+    ])
+
+    async def start():
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, '127.0.0.1', port).start()
+
+        ready.set()
+
+    loop = asyncio.new_event_loop()
+    loop.run_until_complete(start())
+    loop.run_forever()
+
+
+class Traffic:
+    # a fixed population of guilds, each with a couple of channels and some members, built from the same payloads
+    # the gateway would send
+    def __init__(self, client, guilds: int, members: int, command_ratio: float, seed: int):
+        import discord
+
+        self.rng = random.Random(seed)
+        self.command_ratio: float = command_ratio
+        self.ids = itertools.count(10 ** 17)
+
+        state = client._connection
+
+        self.channels: typing.List[typing.Tuple[typing.Any, typing.List[dict]]] = []
+
+        for _ in range(guilds):
+            guild_id = next(self.ids)
+
+            guild = discord.Guild(state=state, data={
+                'id': guild_id, 'name': 'guild {}'.format(guild_id), 'member_count': members + 1,
+                'roles': [{'id': guild_id, 'name': '@everyone', 'position': 0,
+                           'permissions': str(PERMISSIONS), 'permissions_new': str(PERMISSIONS)}],
+                'channels': [{'id': next(self.ids), 'type': 0, 'name': name, 'position': n}
+                             for n, name in enumerate(('general', 'reminders'))],
+            })
+
+            authors = []
+            for member in [BOT_USER] + [{'id': next(self.ids), 'username': 'user', 'discriminator': '0001',
+                                          'avatar': None} for _ in range(members)]:
+                guild._add_member(discord.Member(state=state, guild=guild, data={'user': member, 'roles': []}))
+
+                if member is not BOT_USER:
+                    authors.append(member)
+
+            state._add_guild(guild)
+
+            for channel in guild.text_channels:
+                self.channels.append((channel, authors))
+
+    def message(self) -> typing.Tuple[typing.Any, bool]:
+        import discord
+
+        channel, authors = self.rng.choice(self.channels)
+        command = self.rng.random() < self.command_ratio
+
+        if command:
+            content = self.rng.choices([c for c, _ in COMMANDS], [w for _, w in COMMANDS])[0]
+        else:
+            content = self.rng.choice(CHAT)
+
+        return discord.Message(state=channel._state, channel=channel, data={
+            'id': next(self.ids), 'type': 0, 'content': content.format(n=self.rng.randint(1, 600)),
+            'author': self.rng.choice(authors), 'attachments': [], 'embeds': [], 'mentions': [],
+            'mention_roles': [], 'pinned': False, 'mention_everyone': False, 'tts': False,
+            'timestamp': '2020-01-01T00:00:00+00:00', 'edited_timestamp': None
+        }), command
+
+
+def percentile(samples: typing.List[float], fraction: float) -> typing.Optional[float]:
+    if not samples:
+        return None
+
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summarise(samples: typing.List[float]) -> dict:
+    return {
+        'count': len(samples),
+        'p50_ms': percentile(samples, 0.5),
+        'p99_ms': percentile(samples, 0.99),
+        'max_ms': max(samples) if samples else None,
+    }
+
+
+async def monitor_lag(samples: typing.List[float], interval: float = 0.05):
+    # how late the loop wakes a sleeping task is how long every other task (and every shard's heartbeat) waits
+    loop = asyncio.get_event_loop()
+
+    while True:
+        start = loop.time()
+        await asyncio.sleep(interval)
+        samples.append((loop.time() - start - interval) * 1000)
+
+
+async def drive(client, traffic: Traffic, rate: float, duration: float) -> dict:
+    chat: typing.List[float] = []
+    commands: typing.List[float] = []
+    lag: typing.List[float] = []
+    errors: typing.Dict[str, int] = {}
+
+    # replies are queued and sent in the background, so the replies each message queues are collected to be waited on
+    queued: contextvars.ContextVar = contextvars.ContextVar('queued')
+    send = client.replies.send
+
+    def track(*args, **kwargs):
+        future = send(*args, **kwargs)
+        queued.get().append(future)
+
+        return future
+
+    client.replies.send = track
+
+    async def handle(message, command: bool):
+        start = time.perf_counter()
+        replies: typing.List[asyncio.Future] = []
+        queued.set(replies)
+
+        try:
+            await client.on_message(message)
+
+            # a command is answered once its replies have gone out, not once they're queued
+            if replies:
+                await asyncio.gather(*replies)
+
+        except Exception as e:
+            name = type(e).__name__
+            # nothing needs rolling back: the command's session is discarded along with its scope
+            errors[name] = errors.get(name, 0) + 1
+
+        (commands if command else chat).append((time.perf_counter() - start) * 1000)
+
+    monitor = asyncio.ensure_future(monitor_lag(lag))
+    pending: typing.Set[asyncio.Future] = set()
+
+    start = time.perf_counter()
+    sent = 0
+
+    # open loop: messages arrive on schedule whether or not the bot has kept up, as they would from the gateway
+    while time.perf_counter() - start < duration:
+        due = start + sent / rate
+        delay = due - time.perf_counter()
+
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        task = asyncio.ensure_future(handle(*traffic.message()))
+        pending.add(task)
+        task.add_done_callback(pending.discard)
+
+        sent += 1
+
+    if pending:
+        await asyncio.wait(pending, timeout=30)
+
+    elapsed = time.perf_counter() - start
+    monitor.cancel()
+
+    return {
+        'sent': sent,
+        'handled': len(chat) + len(commands),
+        'unfinished': len(pending),
+        'elapsed_s': elapsed,
+        'messages_per_second': (len(chat) + len(commands)) / elapsed,
+        'chat': summarise(chat),
+        'commands': summarise(commands),
+        'loop_lag': summarise(lag),
+        'errors': errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay generated guild traffic through BotClient.on_message')
+    parser.add_argument('--guilds', type=int, default=2000)
+    parser.add_argument('--members', type=int, default=10, help='members per guild')
+    parser.add_argument('--rate', type=float, default=500, help='messages per second')
+    parser.add_argument('--duration', type=float, default=30, help='seconds of traffic')
+    parser.add_argument('--command-ratio', type=float, default=0.05, help='fraction of messages that are commands')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='file to write the JSON results to')
+    args = parser.parse_args()
+
+    prepare_database()
+
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+
+    ready = multiprocessing.Event()
+    stub = multiprocessing.Process(target=run_stub, args=(port, ready), daemon=True)
+    stub.start()
+    ready.wait(10)
+
+    # the client reads config.ini from the working directory
+    os.chdir(tempfile.mkdtemp(prefix='reminder-load-'))
+    with open('config.ini', 'w') as f:
+        f.write('[DEFAULT]\ntoken = stub\npatreon_enabled = no\nscheduler_enabled = no\n')
+
+    sys.path.insert(0, ROOT)
+
+    import aiohttp
+    import discord
+
+    discord.http.Route.BASE = 'http://127.0.0.1:{}{}'.format(port, API)
+    discord.webhook.WebhookAdapter.BASE = discord.http.Route.BASE
+
+    from main import BotClient
+    from models import create_tables
+
+    create_tables()
+
+    client = BotClient(max_messages=100, guild_subscriptions=False, fetch_offline_members=False)
+
+    async def run() -> dict:
+        data = await client.http.static_login('stub', bot=True)
+        client._connection.user = discord.ClientUser(state=client._connection, data=data)
+
+        await client.on_ready()
+
+        print('Building {} guilds'.format(args.guilds))
+        traffic = Traffic(client, args.guilds, args.members, args.command_ratio, args.seed)
+
+        print('Sending {} messages per second for {}s'.format(args.rate, args.duration))
+        results = await drive(client, traffic, args.rate, args.duration)
+
+        async with aiohttp.ClientSession() as session:
+            async with session.get('http://127.0.0.1:{}/stats'.format(port)) as resp:
+                results['rest_calls'] = await resp.json()
+
+        results.update(guilds=args.guilds, members=args.members, rate=args.rate, command_ratio=args.command_ratio)
+
+        client.natural_parser.shutdown()
+        await client.c_session.close()
+        await client.http.close()
+
+        return results
+
+    results = client.loop.run_until_complete(run())
+    stub.terminate()
+
+    print(json.dumps(results, indent=2))
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
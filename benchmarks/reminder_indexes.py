@@ -0,0 +1,176 @@
+import argparse
+import json
+import random
+import statistics
+import time
+import typing
+
+from sqlalchemy import create_engine, text, MetaData, Table, Column, Boolean
+from sqlalchemy.dialects.mysql import INTEGER as INT
+
+# a scratch copy of the reminders columns that the polling and listing queries touch. it lives in its own table so
+# the benchmark can be pointed at a real database without going near the real reminders
+metadata = MetaData()
+
+bench_reminders = Table('bench_reminders', metadata,
+                        Column('id', INT(unsigned=True), primary_key=True),
+                        Column('message_id', INT(unsigned=True), nullable=False),
+                        Column('channel_id', INT(unsigned=True), nullable=False),
+                        Column('time', INT(unsigned=True), nullable=False),
+                        Column('enabled', Boolean, nullable=False),
+                        Column('interval', INT(unsigned=True)),
+                        mysql_engine='InnoDB')
+
+# kept the same as Reminder.__table_args__. created by hand after the first measurement rather than with the table
+INDEXES: typing.List[str] = [
+    'CREATE INDEX reminders_due ON bench_reminders (enabled, time)',
+    'CREATE INDEX reminders_channel_due ON bench_reminders (channel_id, enabled, time)',
+]
+
+QUERIES: typing.Dict[str, str] = {
+    # ReminderScheduler refilling its window
+    'poll': 'SELECT id, time FROM bench_reminders WHERE enabled = 1 AND time >= :start AND time <= :end',
+    # first page of look, and of look enabled
+    'look': 'SELECT id, time, enabled FROM bench_reminders WHERE channel_id = :channel '
+            'ORDER BY time, id LIMIT 100',
+    'look_enabled': 'SELECT id, time, enabled FROM bench_reminders WHERE channel_id = :channel AND enabled = 1 '
+                    'ORDER BY time, id LIMIT 100',
+    # a later page of look, resumed from a cursor
+    'look_next': 'SELECT id, time, enabled FROM bench_reminders WHERE channel_id = :channel '
+                 'AND (time > :time OR (time = :time AND id > :id)) ORDER BY time, id LIMIT 100',
+}
+
+# the statements that differ between databases, by dialect name. anything not listed uses the default
+ANALYZE: typing.Dict[str, str] = {'mysql': 'ANALYZE TABLE bench_reminders'}
+ANALYZE_DEFAULT = 'ANALYZE bench_reminders'
+
+EXPLAIN: typing.Dict[str, str] = {'sqlite': 'EXPLAIN QUERY PLAN '}
+EXPLAIN_DEFAULT = 'EXPLAIN '
+
+# the column of a plan row that names how the table is read: mysql's key, sqlite's detail
+PLAN_COLUMNS = ('key', 'detail')
+
+
+def analyze(conn):
+    conn.execute(text(ANALYZE.get(conn.dialect.name, ANALYZE_DEFAULT)))
+
+
+def access(plan: typing.List[dict]) -> typing.Optional[str]:
+    return next((plan[0][column] for column in PLAN_COLUMNS if column in plan[0]), None)
+
+
+def populate(engine, rows: int, channels: int, seed: int):
+    rng = random.Random(seed)
+    now = int(time.time())
+
+    metadata.drop_all(engine)
+    metadata.create_all(engine)
+
+    # most channels have a handful of reminders and a few have thousands
+    weights = [1 / (n + 1) for n in range(channels)]
+    channel_ids = list(range(1, channels + 1))
+
+    with engine.begin() as conn:
+        for start in range(0, rows, 10000):
+            chosen = rng.choices(channel_ids, weights, k=min(10000, rows - start))
+
+            conn.execute(bench_reminders.insert(), [
+                {
+                    'message_id': start + n + 1,
+                    'channel_id': channel,
+                    'time': now + rng.randint(-3600, 86400 * 365),
+                    'enabled': rng.random() < 0.95,
+                    'interval': rng.choice([None, None, None, 86400])
+                }
+                for n, channel in enumerate(chosen)
+            ])
+
+    with engine.connect() as conn:
+        analyze(conn)
+
+
+def measure(engine, repeats: int) -> typing.Dict[str, dict]:
+    now = int(time.time())
+    explain = EXPLAIN.get(engine.dialect.name, EXPLAIN_DEFAULT)
+
+    with engine.connect() as conn:
+        # the busiest channel, as that's where a missing index hurts look the most
+        channel = conn.execute(text(
+            'SELECT channel_id FROM bench_reminders GROUP BY channel_id ORDER BY COUNT(*) DESC LIMIT 1')).scalar()
+        cursor_time, cursor_id = conn.execute(text(
+            'SELECT time, id FROM bench_reminders WHERE channel_id = :channel ORDER BY time, id LIMIT 1 OFFSET 500'),
+            channel=channel).first()
+
+        params = {'start': now, 'end': now + 300, 'channel': channel, 'time': cursor_time, 'id': cursor_id}
+
+        results: typing.Dict[str, dict] = {}
+
+        for name, query in QUERIES.items():
+            plan = [dict(row) for row in conn.execute(text(explain + query), **params)]
+
+            timings: typing.List[float] = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                conn.execute(text(query), **params).fetchall()
+                timings.append((time.perf_counter() - start) * 1000)
+
+            results[name] = {
+                'plan': plan,
+                'median_ms': statistics.median(timings),
+                'max_ms': max(timings),
+            }
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Time the reminder polling and listing queries on a synthetic table, without and with the '
+                    'reminders_due and reminders_channel_due indexes')
+    parser.add_argument('url', help='SQLAlchemy URL of the database to create the scratch table in. MySQL is what '
+                                    'the bot runs on, but SQLite works too')
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--channels', type=int, default=5000)
+    parser.add_argument('--repeats', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='file to write the JSON results to, rather than stdout')
+    parser.add_argument('--keep', action='store_true', help='leave the scratch table in place afterwards')
+    args = parser.parse_args()
+
+    engine = create_engine(args.url)
+
+    start = time.perf_counter()
+    populate(engine, args.rows, args.channels, args.seed)
+    print('Loaded {} rows in {:.1f}s'.format(args.rows, time.perf_counter() - start))
+
+    results = {'rows': args.rows, 'channels': args.channels, 'before': measure(engine, args.repeats)}
+
+    with engine.connect() as conn:
+        for index in INDEXES:
+            conn.execute(text(index))
+
+        analyze(conn)
+
+    results['after'] = measure(engine, args.repeats)
+
+    for name in QUERIES:
+        print('{:<14} {:>9.2f}ms -> {:>9.2f}ms  ({} -> {})'.format(
+            name,
+            results['before'][name]['median_ms'],
+            results['after'][name]['median_ms'],
+            access(results['before'][name]['plan']),
+            access(results['after'][name]['plan'])))
+
+    if not args.keep:
+        metadata.drop_all(engine)
+
+    if args.output is None:
+        print(json.dumps(results, indent=2, default=str))
+
+    else:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2, default=str)
+
+
+if __name__ == '__main__':
+    main()
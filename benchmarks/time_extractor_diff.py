@@ -0,0 +1,184 @@
+import argparse
+import datetime
+import json
+import random
+import sys
+import time
+import typing
+
+from hot_paths import ROOT, DISPLACEMENT_TIMES, EXPLICIT_TIMES
+
+# runs the current TimeExtractor and the one it replaced (time_extractor_reference.py) over the same strings, zones
+# and moments, and reports every input where they disagree along with how long each takes per parse
+
+# zones with and without DST, with DST shifts of an hour and of half an hour, and one that has since dropped DST
+ZONES = ['UTC', 'Asia/Kolkata', 'Europe/London', 'America/New_York', 'Australia/Lord_Howe', 'Pacific/Chatham',
+         'America/Sao_Paulo']
+
+# inputs the bot is given, and inputs that only the old split/int path accepted
+CASES = EXPLICIT_TIMES + DISPLACEMENT_TIMES + [
+    '1/1', '31/2', '29/2', '29/2/2028', '1/1/2030', '12:30-1/1', '5', '31', '0:00', '23:59:59', '24:00', '12:60',
+    '12:30:15:1', '1/2/3/4', ' 5:3', '+5:3', '1_0:00', '-12:30', '1h1h', '1h30m', '1d2h3m4s', '10', 'm', '', '-',
+    '-1h', '٣h', '1x',
+]
+
+# the alphabet random inputs are drawn from
+ALPHABET = '0123456789smhd/:- x+_'
+
+# how far either side of a DST transition the clock is put
+TRANSITION_OFFSETS = [-86400, -3600, -1, 0, 1, 1800, 3600, 86400]
+
+KINDS = ('extract_exact', 'extract_displacement')
+
+
+def transitions(zone: str, start: int, end: int) -> typing.List[float]:
+    import pytz
+
+    return [moment.replace(tzinfo=datetime.timezone.utc).timestamp()
+            for moment in getattr(pytz.timezone(zone), '_utc_transition_times', [])
+            if start <= moment.year < end]
+
+
+def wall_clock(zone: str, moment: float) -> typing.List[str]:
+    # explicit times on the local day of a transition, so some land in the hour that is skipped or repeated
+    import pytz
+
+    local = datetime.datetime.fromtimestamp(moment, pytz.timezone(zone))
+    day = '{0.day}/{0.month}/{0.year}'.format(local)
+
+    return [day] + ['{}-{}:{:02d}'.format(day, hour, minute) for hour in range(local.hour - 1, local.hour + 2)
+                    if 0 <= hour < 24 for minute in (0, 30)]
+
+
+class Differ:
+    def __init__(self):
+        sys.path.insert(0, ROOT)
+
+        import time_extractor
+        import time_extractor_reference
+
+        self.current = time_extractor
+        self.reference = time_extractor_reference
+
+        self.compared: int = 0
+        self.mismatches: typing.List[dict] = []
+
+    def pin(self, now: float):
+        # the reference reads the clock through datetime.now and unix_time
+        class Pinned(datetime.datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return datetime.datetime.fromtimestamp(now, tz)
+
+        self.reference.datetime = Pinned
+        self.reference.unix_time = lambda: now
+
+    def outcome(self, extractor, kind: str, *args) -> typing.Union[int, str]:
+        try:
+            return getattr(extractor, kind)(*args)
+
+        except (self.current.InvalidTime, self.reference.InvalidTime):
+            return 'invalid'
+
+        except Exception as e:
+            return type(e).__name__
+
+    def compare(self, string: str, zone: str, now: float):
+        self.pin(now)
+
+        for kind in KINDS:
+            old = self.outcome(self.reference.TimeExtractor(string, zone), kind)
+            new = self.outcome(self.current.TimeExtractor(string, zone), kind, now)
+
+            self.compared += 1
+
+            if old != new:
+                self.mismatches.append({'string': string, 'zone': zone, 'now': now, 'kind': kind,
+                                        'reference': old, 'current': new})
+
+    def time(self, strings: typing.List[str], zone: str, now: float, repeats: int) -> dict:
+        self.pin(now)
+
+        def run(parse) -> float:
+            start = time.perf_counter()
+
+            for _ in range(repeats):
+                for string in strings:
+                    try:
+                        parse(string)
+
+                    except Exception:
+                        pass
+
+            return (time.perf_counter() - start) * 1e6 / (repeats * len(strings))
+
+        return {
+            'reference_us': run(lambda string: self.reference.TimeExtractor(string, zone).extract_exact()),
+            'current_us': run(lambda string: self.current.TimeExtractor(string, zone).extract_exact(now)),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Check TimeExtractor against the implementation it replaced, across DST transitions')
+    parser.add_argument('--random', type=int, default=100000, help='random strings to compare on top of the cases')
+    parser.add_argument('--years', type=int, nargs=2, default=[2015, 2035], metavar=('FROM', 'TO'),
+                        help='years whose DST transitions the clock is put around')
+    parser.add_argument('--repeats', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='file to write the JSON results to')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    differ = Differ()
+
+    moments: typing.Dict[str, typing.List[float]] = {}
+
+    for zone in ZONES:
+        edges = transitions(zone, *args.years)
+
+        # in order, so the current implementation's cached offset is carried across each transition, then a few
+        # moments out of order so it has to go back to an earlier one
+        moments[zone] = sorted(edge + offset for edge in edges for offset in TRANSITION_OFFSETS) + \
+            [rng.uniform(*(datetime.datetime(year, 1, 1).timestamp() for year in args.years)) for _ in range(20)]
+
+        for now in moments[zone]:
+            for string in CASES:
+                differ.compare(string, zone, now)
+
+        for edge in edges:
+            for string in wall_clock(zone, edge):
+                for offset in TRANSITION_OFFSETS:
+                    differ.compare(string, zone, edge + offset)
+
+    for _ in range(args.random):
+        zone = rng.choice(ZONES)
+        string = ''.join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 9)))
+
+        differ.compare(string, zone, rng.choice(moments[zone]))
+
+    results = {
+        'compared': differ.compared,
+        'mismatched': len(differ.mismatches),
+        'mismatches': differ.mismatches[:50],
+        'timings': {zone: differ.time(CASES, zone, time.time(), args.repeats) for zone in ZONES},
+    }
+
+    print('{} comparisons, {} mismatched'.format(differ.compared, len(differ.mismatches)))
+
+    for mismatch in differ.mismatches[:10]:
+        print('  {string!r} in {zone} at {now}, {kind}: {reference} -> {current}'.format(**mismatch))
+
+    for zone, timing in results['timings'].items():
+        print('{:<20} {:>8.2f}us -> {:>8.2f}us'.format(zone, timing['reference_us'], timing['current_us']))
+
+    if args.output is not None:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if differ.mismatches:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+import collections
+import itertools
+import threading
+import typing
+
+from models import Guild
+
+
+class PrefixCache:
+    # guild snowflake -> prefix, so messages that don't start with the guild's prefix are rejected without touching
+    # the database. guilds without a row in the table haven't changed their prefix, so they use the column default
+    def __init__(self):
+        self._prefixes: typing.Dict[int, str] = {}
+        self.default: str = Guild.prefix.default.arg
+
+    def __len__(self):
+        return len(self._prefixes)
+
+    def load(self, rows: typing.Iterable[typing.Tuple[int, str]]):
+        self._prefixes = {guild_id: prefix for guild_id, prefix in rows}
+
+    def get(self, guild_id: int) -> str:
+        return self._prefixes.get(guild_id, self.default)
+
+    def set(self, guild_id: int, prefix: str):
+        self._prefixes[guild_id] = prefix
+
+    def discard(self, guild_id: int):
+        self._prefixes.pop(guild_id, None)
+
+
+class IdentityCache:
+    # bounded LRU of rows keyed by discord snowflake, so repeat lookups of the same user, guild or channel cost
+    # nothing. the cached instances carry the internal id and hot columns. they're detached from any session, and
+    # Database.attach gives each command a copy to read and change
+    def __init__(self, size: int = 10000):
+        self.size: int = size
+        self.hits: int = 0
+        self.misses: int = 0
+
+        self._rows: collections.OrderedDict = collections.OrderedDict()
+        # key -> number of its last discard, for the last `size` keys discarded (see generation)
+        self._generations: collections.OrderedDict = collections.OrderedDict()
+        self._discards = itertools.count(1)
+        # the database executor fills the cache while the event loop reads and invalidates it
+        self._lock: threading.Lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._rows)
+
+    def get(self, key: int):
+        with self._lock:
+            row = self._rows.get(key)
+
+            if row is None:
+                self.misses += 1
+
+            else:
+                self.hits += 1
+                self._rows.move_to_end(key)
+
+            return row
+
+    def generation(self, key: int) -> int:
+        # taken before a row is loaded and given back to put, which turns the row away if the key was discarded while
+        # the load ran, since the row may have been read before the change that discarded it was committed
+        with self._lock:
+            return self._generations.get(key, 0)
+
+    def put(self, key: int, row, generation: typing.Optional[int] = None):
+        with self._lock:
+            if generation is not None and self._generations.get(key, 0) != generation:
+                return
+
+            self._rows[key] = row
+            self._rows.move_to_end(key)
+
+            while len(self._rows) > self.size:
+                self._rows.popitem(last=False)
+
+    def discard(self, key: int):
+        with self._lock:
+            self._rows.pop(key, None)
+
+            self._generations[key] = next(self._discards)
+            self._generations.move_to_end(key)
+
+            while len(self._generations) > self.size:
+                self._generations.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._rows.clear()
+
+
+class RestrictionIndex:
+    # guild snowflake -> role id -> commands that role may run, loaded once per guild from command_restrictions so
+    # checking a MANAGED command is a set intersection rather than a query
+    def __init__(self):
+        self._guilds: typing.Dict[int, typing.Dict[int, typing.Set[str]]] = {}
+
+    def get(self, guild_id: int) -> typing.Optional[typing.Dict[int, typing.Set[str]]]:
+        return self._guilds.get(guild_id)
+
+    def load(self, guild_id: int, rows: typing.Iterable[typing.Tuple[int, str]]) -> typing.Dict[int, typing.Set[str]]:
+        roles: typing.Dict[int, typing.Set[str]] = {}
+
+        for role, command in rows:
+            roles.setdefault(role, set()).add(command)
+
+        self._guilds[guild_id] = roles
+
+        return roles
+
+    def add(self, guild_id: int, role: int, command: str):
+        if guild_id in self._guilds:
+            self._guilds[guild_id].setdefault(role, set()).add(command)
+
+    def remove_role(self, guild_id: int, role: int):
+        if guild_id in self._guilds:
+            self._guilds[guild_id].pop(role, None)
+
+    def discard(self, guild_id: int):
+        self._guilds.pop(guild_id, None)
+
+    def clear(self):
+        self._guilds.clear()
+
+
+class BlacklistIndex:
+    # guild snowflake -> snowflakes of its blacklisted channels, loaded once per guild so checking a command's channel
+    # is a set lookup rather than loading (and rewriting) the channel's row
+    def __init__(self):
+        self._guilds: typing.Dict[int, typing.Set[int]] = {}
+
+    def get(self, guild_id: int) -> typing.Optional[typing.Set[int]]:
+        return self._guilds.get(guild_id)
+
+    def load(self, guild_id: int, channels: typing.Iterable[int]) -> typing.Set[int]:
+        blacklisted = set(channels)
+        self._guilds[guild_id] = blacklisted
+
+        return blacklisted
+
+    def add(self, guild_id: int, channel_id: int):
+        if guild_id in self._guilds:
+            self._guilds[guild_id].add(channel_id)
+
+    def remove(self, guild_id: int, channel_id: int):
+        if guild_id in self._guilds:
+            self._guilds[guild_id].discard(channel_id)
+
+    def discard(self, guild_id: int):
+        self._guilds.pop(guild_id, None)
+
+    def clear(self):
+        self._guilds.clear()
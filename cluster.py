@@ -0,0 +1,209 @@
+import asyncio
+import multiprocessing
+import queue
+import signal
+import time
+import typing
+
+import aiohttp
+import discord
+
+# a worker that stays up this long is considered healthy again, and its restart backoff is reset
+STABLE_AFTER = 300
+MAX_BACKOFF = 60
+
+
+def shard_ranges(shard_count: int, processes: int) -> typing.List[typing.List[int]]:
+    # contiguous, as even as possible. the first shard_count % processes workers take one extra shard
+    size, extra = divmod(shard_count, processes)
+    ranges = []
+    start = 0
+
+    for n in range(processes):
+        end = start + size + (1 if n < extra else 0)
+        ranges.append(list(range(start, end)))
+        start = end
+
+    return [r for r in ranges if r]
+
+
+async def recommended_shards(token: str) -> int:
+    async with aiohttp.ClientSession() as session:
+        async with session.get(discord.http.Route.BASE + '/gateway/bot',
+                               headers={'authorization': 'Bot {}'.format(token)}) as resp:
+            return (await resp.json())['shards']
+
+
+class ClusterLink:
+    # a worker's end of the cluster: the shared guild counts, and the queues that carry cache invalidations to and
+    # from the other workers through the supervisor
+    def __init__(self, index: int, inbox, outbox, guild_counts):
+        self.index: int = index
+
+        self._inbox = inbox
+        self._outbox = outbox
+        self._guild_counts = guild_counts
+
+        self._task: typing.Optional[asyncio.Task] = None
+
+    def publish(self, kind: str, *args):
+        self._outbox.put((self.index, kind) + args)
+
+    def set_guilds(self, count: int):
+        self._guild_counts[self.index] = count
+
+    def total_guilds(self) -> int:
+        return sum(self._guild_counts)
+
+    def listen(self, handler: typing.Callable[..., typing.Awaitable[None]]):
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._listen(handler))
+
+    async def _listen(self, handler: typing.Callable[..., typing.Awaitable[None]]):
+        loop = asyncio.get_event_loop()
+
+        while True:
+            # the queue only has a blocking get, so it waits on a thread rather than the event loop
+            kind, *args = await loop.run_in_executor(None, self._inbox.get)
+
+            try:
+                await handler(kind, *args)
+
+            except Exception as e:
+                print('Failed to apply {} invalidation {}: {}'.format(kind, args, e))
+
+
+def run_worker(link: ClusterLink, shard_ids: typing.List[int], shard_count: int, client_options: dict):
+    # imported here so the supervisor never sets up a client, database or parser pool of its own
+    from main import BotClient
+
+    client = BotClient(shard_ids=shard_ids, shard_count=shard_count, cluster=link, **client_options)
+    client.run(client.config.token)
+
+
+class Worker:
+    def __init__(self, index: int, shard_ids: typing.List[int], inbox):
+        self.index: int = index
+        self.shard_ids: typing.List[int] = shard_ids
+        self.inbox = inbox
+
+        self.process: typing.Optional[multiprocessing.Process] = None
+        self.started: float = 0
+        self.restarts: int = 0
+        self.restart_at: typing.Optional[float] = None
+
+
+class Cluster:
+    # runs the shards over several processes so they don't share one GIL and event loop. the supervisor restarts
+    # workers that die, and relays every invalidation a worker publishes to all the others
+    def __init__(self, token: str, processes: int, shard_count: int = 0, **client_options):
+        self.token: str = token
+        self.processes: int = processes
+        self.shard_count: int = shard_count
+        self.client_options: dict = client_options
+
+        self.context = multiprocessing.get_context('spawn')
+
+        self.outbox = self.context.Queue()
+        self.guild_counts = None
+
+        self.workers: typing.List[Worker] = []
+        self._stopping: bool = False
+
+    def run(self):
+        if self.shard_count == 0:
+            self.shard_count = asyncio.get_event_loop().run_until_complete(recommended_shards(self.token))
+
+        ranges = shard_ranges(self.shard_count, self.processes)
+        print('Running {} shards over {} processes'.format(self.shard_count, len(ranges)))
+
+        self.guild_counts = self.context.Array('l', len(ranges), lock=False)
+        self.workers = [Worker(n, shard_ids, self.context.Queue()) for n, shard_ids in enumerate(ranges)]
+
+        signal.signal(signal.SIGTERM, lambda *_: self.request_stop())
+
+        for worker in self.workers:
+            self._start(worker)
+
+        try:
+            while not self._stopping:
+                self._relay()
+                self._supervise()
+
+        except KeyboardInterrupt:
+            pass
+
+        finally:
+            self.stop()
+
+    def request_stop(self):
+        # the loop in run notices this and stops the workers itself
+        self._stopping = True
+
+    def stop(self):
+        self._stopping = True
+
+        for worker in self.workers:
+            if worker.process is not None and worker.process.is_alive():
+                worker.process.terminate()
+
+        for worker in self.workers:
+            if worker.process is not None:
+                worker.process.join(10)
+
+    def _start(self, worker: Worker):
+        # anything queued for the old process is moot, since a new one loads its caches from scratch
+        try:
+            while True:
+                worker.inbox.get_nowait()
+        except queue.Empty:
+            pass
+
+        link = ClusterLink(worker.index, worker.inbox, self.outbox, self.guild_counts)
+
+        worker.process = self.context.Process(
+            target=run_worker, args=(link, worker.shard_ids, self.shard_count, self.client_options),
+            name='shards-{}-{}'.format(worker.shard_ids[0], worker.shard_ids[-1]))
+        worker.process.start()
+
+        worker.started = time.time()
+        worker.restart_at = None
+
+        print('Started worker {} (pid {}) for shards {}-{}'.format(
+            worker.index, worker.process.pid, worker.shard_ids[0], worker.shard_ids[-1]))
+
+    def _relay(self):
+        try:
+            sender, *message = self.outbox.get(timeout=1)
+
+        except queue.Empty:
+            return
+
+        for worker in self.workers:
+            if worker.index != sender:
+                worker.inbox.put(tuple(message))
+
+    def _supervise(self):
+        if self._stopping:
+            return
+
+        now = time.time()
+
+        for worker in self.workers:
+            if worker.restart_at is not None:
+                if now >= worker.restart_at:
+                    self._start(worker)
+
+            elif not worker.process.is_alive():
+                if now - worker.started > STABLE_AFTER:
+                    worker.restarts = 0
+
+                backoff = min(MAX_BACKOFF, 5 * 2 ** worker.restarts)
+                worker.restarts += 1
+                worker.restart_at = now + backoff
+
+                # its guilds are gone from the total until it reconnects
+                self.guild_counts[worker.index] = 0
+
+                print('Worker {} exited with {}. Restarting in {}s'.format(
+                    worker.index, worker.process.exitcode, backoff))
@@ -13,4 +13,21 @@ class Config(IniDeserializer):
 
     local_timezone = Field(default='UTC')
 
-    DEFAULT = Section(patreon_role, patreon_server, patreon_enabled, dbl_token, token, local_timezone)
+    scheduler_enabled = BooleanField(default=False)
+    scheduler_window = IntegerField(default=300)
+
+    database_workers = IntegerField(default=4)
+    write_interval = IntegerField(default=10)
+
+    natural_workers = IntegerField(default=2)
+    natural_timeout = IntegerField(default=5)
+
+    metrics_host = Field(default='127.0.0.1')
+    metrics_port = IntegerField(default=0)
+
+    cluster_processes = IntegerField(default=1)
+    shard_count = IntegerField(default=0)
+
+    DEFAULT = Section(patreon_role, patreon_server, patreon_enabled, dbl_token, token, local_timezone,
+                      scheduler_enabled, scheduler_window, database_workers, write_interval, natural_workers,
+                      natural_timeout, metrics_host, metrics_port, cluster_processes, shard_count)
@@ -102,6 +102,9 @@ CREATE TABLE reminders.reminders (
     PRIMARY KEY (id),
     FOREIGN KEY (message_id) REFERENCES reminders.messages(id) ON DELETE RESTRICT,
     FOREIGN KEY (channel_id) REFERENCES reminders.channels(id) ON DELETE CASCADE,
+
+    INDEX reminders_due (enabled, `time`),
+    INDEX reminders_channel_due (channel_id, enabled, `time`)
 );
 
 CREATE TRIGGER message_cleanup AFTER DELETE ON reminders.reminders
@@ -116,9 +119,12 @@ CREATE TABLE reminders.todos (
     id INT UNSIGNED AUTO_INCREMENT UNIQUE NOT NULL,
     guild_id INT UNSIGNED,
     user_id INT UNSIGNED,
+    position INT UNSIGNED NOT NULL,
     value VARCHAR(2000) NOT NULL,
 
     PRIMARY KEY (id),
+    UNIQUE KEY todos_user_position (user_id, position),
+    UNIQUE KEY todos_guild_position (guild_id, position),
     FOREIGN KEY (guild_id) REFERENCES reminders.guilds(id) ON DELETE CASCADE,
     FOREIGN KEY (user_id) REFERENCES reminders.users(id) ON DELETE CASCADE
 );
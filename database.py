@@ -0,0 +1,580 @@
+import asyncio
+import concurrent.futures
+import contextlib
+import contextvars
+import typing
+from functools import partial
+
+from sqlalchemy import event, func, bindparam, inspect
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import make_transient_to_detached
+
+from caches import IdentityCache, RestrictionIndex, BlacklistIndex
+from models import Guild, User, Channel, Language, CommandRestriction, Reminder, Message, Embed, Todo, session, \
+    session_factory, session_scope, guild_users
+
+# times an add to a todo list is tried before giving up on taking a position
+TODO_ATTEMPTS = 3
+
+
+class ReminderCursor:
+    # where a reminder listing got up to. the last (time, id) seen is enough to resume, since the listing is ordered
+    # on that pair, so no offset has to be skipped over and nothing but the key is kept between pages
+    __slots__ = ('channel_id', 'enabled_only', 'remaining', 'after')
+
+    def __init__(self, channel_id: int, enabled_only: bool = False, remaining: typing.Optional[int] = None):
+        self.channel_id: int = channel_id
+        self.enabled_only: bool = enabled_only
+        self.remaining: typing.Optional[int] = remaining
+        self.after: typing.Optional[typing.Tuple[int, int]] = None
+
+
+class WriteBehind:
+    # writes nobody waits on: the names of channels, users and guilds, which change rarely but are seen on every
+    # command, and guild membership. they're collected here and written together in one transaction every `interval`
+    # seconds (or as soon as `limit` are waiting), and only when they differ from what was last written, so a command
+    # costs no writes or commits of its own for them. anything a user can see the result of is committed as before
+    def __init__(self, database: 'Database', interval: int = 10, limit: int = 1000, size: int = 10000):
+        self.database: 'Database' = database
+        self.interval: int = interval
+        self.limit: int = limit
+        self.written: int = 0
+        self.flushes: int = 0
+
+        # kind -> the statement run for every waiting write of that kind, as one executemany
+        self._statements: typing.Dict[str, typing.Any] = {}
+        # kind -> key -> parameters. a later write to the same key replaces the earlier one
+        self._pending: typing.Dict[str, typing.Dict[typing.Hashable, dict]] = {}
+        # (kind, key) -> parameters last written
+        self._last: IdentityCache = IdentityCache(size)
+
+        self._wake: asyncio.Event = asyncio.Event()
+        self._task: typing.Optional[asyncio.Task] = None
+
+    def __len__(self):
+        return sum(len(pending) for pending in self._pending.values())
+
+    def register(self, kind: str, statement):
+        self._statements[kind] = statement
+        self._pending[kind] = {}
+
+    def note(self, kind: str, key: typing.Hashable, **params):
+        if self._last.get((kind, key)) != params:
+            self._pending[kind][key] = params
+
+            if len(self) >= self.limit:
+                self._wake.set()
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+
+            except asyncio.TimeoutError:
+                pass
+
+            self._wake.clear()
+
+            try:
+                await self.flush()
+
+            except Exception as e:
+                print('Failed to write {} updates: {}'.format(len(self), e))
+
+    async def flush(self):
+        if len(self) == 0:
+            return
+
+        batches = {kind: pending for kind, pending in self._pending.items() if pending}
+
+        for kind in batches:
+            self._pending[kind] = {}
+
+        def _write():
+            for kind, pending in batches.items():
+                session.execute(self._statements[kind], list(pending.values()))
+
+            session.commit()
+
+        try:
+            async with self.database.scope():
+                await self.database.run(_write)
+
+        except Exception:
+            # put the batch back behind anything noted since, so it's tried again next time
+            for kind, pending in batches.items():
+                self._pending[kind] = {**pending, **self._pending[kind]}
+
+            raise
+
+        self.flushes += 1
+
+        for kind, pending in batches.items():
+            self.written += len(pending)
+
+            for key, params in pending.items():
+                self._last.put((kind, key), params)
+
+
+class Database:
+    # every ORM call is run on this executor so a MySQL round-trip never blocks the event loop (and with it
+    # the gateway heartbeat of every shard). each command has a session of its own (see scope), so with more than one
+    # worker the statements of different commands run at once, and one can't commit or roll back another's work
+    def __init__(self, workers: int = 1, cache_size: int = 10000, write_interval: int = 10):
+        self.executor: concurrent.futures.ThreadPoolExecutor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix='database')
+
+        # keyed by discord snowflake. the rows are detached, and each scope works on a copy of its own (see attach).
+        # a commit that changes one of them drops it from here, so the next lookup loads it again
+        self.users: IdentityCache = IdentityCache(cache_size)
+        self.guilds: IdentityCache = IdentityCache(cache_size)
+        self.channels: IdentityCache = IdentityCache(cache_size)
+
+        self.restrictions: RestrictionIndex = RestrictionIndex()
+        self.blacklists: BlacklistIndex = BlacklistIndex()
+
+        self.write_behind: WriteBehind = WriteBehind(self, interval=write_interval, size=cache_size)
+
+        # a row that doesn't exist yet matches nothing, and gets its name when something creates it
+        self.write_behind.register('channel', Channel.__table__.update()
+                                   .where(Channel.channel == bindparam('snowflake'))
+                                   .values(name=bindparam('new_name'),
+                                           guild_id=func.coalesce(Channel.guild_id, bindparam('new_guild_id'))))
+        self.write_behind.register('user', User.__table__.update()
+                                   .where(User.user == bindparam('snowflake')).values(name=bindparam('new_name')))
+        self.write_behind.register('guild', Guild.__table__.update()
+                                   .where(Guild.guild == bindparam('snowflake')).values(name=bindparam('new_name')))
+        # the guild_user key makes a repeat a no-op, so there's no need to look through the user's guilds first
+        self.write_behind.register('member', guild_users.insert()
+                                   .prefix_with('IGNORE', dialect='mysql')
+                                   .prefix_with('OR IGNORE', dialect='sqlite'))
+
+        # users, guilds and channels are created one at a time, so two commands from someone new can't both insert them
+        self._creating: asyncio.Lock = asyncio.Lock()
+
+        event.listen(session_factory, 'after_flush', self._note_changes)
+        event.listen(session_factory, 'after_commit', self._evict_changes)
+        event.listen(session_factory, 'after_rollback', lambda s: s.info.pop('changed', None))
+
+    async def run(self, func, *args, **kwargs):
+        # copy the context so context variables set by the calling task are visible on the worker
+        context = contextvars.copy_context()
+
+        return await asyncio.get_event_loop().run_in_executor(
+            self.executor, partial(context.run, func, *args, **kwargs))
+
+    @contextlib.asynccontextmanager
+    async def scope(self):
+        # a session for one command or background job, used by everything it runs through `run`. whatever it hasn't
+        # committed by the end is rolled back when the session is closed
+        token = session_scope.set(object())
+
+        try:
+            yield
+
+        finally:
+            await self.run(session.remove)
+            session_scope.reset(token)
+
+    async def isolated(self, func, *args):
+        # run func in a scope of its own and commit straight away, so the rows it writes are seen by every other
+        # command at once, rather than held (along with their locks) until the calling command finishes. the commit is
+        # made in the same call, so the transaction never stays open while other work gets the worker
+        def _run():
+            result = func(*args)
+            session.commit()
+
+            return result
+
+        async with self.scope():
+            return await self.run(_run)
+
+    @staticmethod
+    def detached_copy(row):
+        # a copy of a loaded row that belongs to no session, for the caches, so the scope that loaded the row can go on
+        # changing its own instance
+        state = inspect(row)
+
+        copy = state.mapper.class_()
+        for attribute in state.mapper.column_attrs:
+            if attribute.key not in state.unloaded:
+                setattr(copy, attribute.key, getattr(row, attribute.key))
+
+        make_transient_to_detached(copy)
+
+        return copy
+
+    @staticmethod
+    def attach(row):
+        # the current scope's copy of a cached row. merging without a load costs no query, and a row the scope already
+        # holds is returned as it is so its uncommitted changes aren't overwritten
+        if row is None:
+            return None
+
+        return session.identity_map.get(inspect(row).key) or session.merge(row, load=False)
+
+    def _note_changes(self, flushed_session, _context):
+        changed = flushed_session.info.setdefault('changed', set())
+
+        for row in flushed_session.dirty | flushed_session.deleted:
+            if isinstance(row, User):
+                changed.add((self.users, row.user))
+
+            elif isinstance(row, Guild):
+                changed.add((self.guilds, row.guild))
+
+            elif isinstance(row, Channel):
+                changed.add((self.channels, row.channel))
+
+    @staticmethod
+    def _evict_changes(committed_session):
+        for cache, key in committed_session.info.pop('changed', ()):
+            cache.discard(key)
+
+    async def commit(self):
+        await self.run(session.commit)
+
+    async def get_user(self, user_id: int) -> typing.Optional[User]:
+        user = self.users.get(user_id)
+
+        if user is None:
+            generation = self.users.generation(user_id)
+            user = await self.run(self._get_user, user_id)
+
+            if user is not None:
+                self.users.put(user_id, self.detached_copy(user), generation)
+
+            return user
+
+        return self.attach(user)
+
+    async def create_user(self, user_id: int, name: str, dm_channel_id: int) -> User:
+        generation = self.users.generation(user_id)
+
+        async with self._creating:
+            user = await self.isolated(self._create_user, user_id, name, dm_channel_id)
+
+        self.users.put(user_id, user, generation)
+
+        return self.attach(user)
+
+    async def get_or_create_guild(self, guild_id: int) -> Guild:
+        guild = self.guilds.get(guild_id)
+
+        if guild is None:
+            generation = self.guilds.generation(guild_id)
+
+            async with self._creating:
+                guild = await self.isolated(self._get_or_create_guild, guild_id)
+
+            self.guilds.put(guild_id, guild, generation)
+
+        return self.attach(guild)
+
+    async def get_prefixes(self) -> typing.List[typing.Tuple[int, str]]:
+        return await self.run(lambda: session.query(Guild.guild, Guild.prefix).all())
+
+    async def get_or_create_channel(self, discord_channel) -> (Channel, bool):
+        channel: typing.Optional[Channel] = self.channels.get(discord_channel.id)
+        new = False
+
+        if channel is None:
+            generation = self.channels.generation(discord_channel.id)
+
+            async with self._creating:
+                channel, new = await self.isolated(self._get_or_create_channel, discord_channel)
+
+            self.channels.put(discord_channel.id, channel, generation)
+
+        return self.attach(channel), new
+
+    async def get_blacklist(self, discord_guild) -> typing.Set[int]:
+        blacklist = self.blacklists.get(discord_guild.id)
+
+        if blacklist is None:
+            # looked up by the guild's channels rather than the guild's row, since older channel rows have no guild
+            channel_ids = [channel.id for channel in discord_guild.text_channels]
+
+            rows = await self.run(lambda: session.query(Channel.channel)
+                                  .filter(Channel.channel.in_(channel_ids))
+                                  .filter(Channel.blacklisted == True).all())
+
+            blacklist = self.blacklists.load(discord_guild.id, (channel_id for channel_id, in rows))
+
+        return blacklist
+
+    async def get_restrictions(self, guild_id: int) -> typing.Dict[int, typing.Set[str]]:
+        restrictions = self.restrictions.get(guild_id)
+
+        if restrictions is None:
+            rows = await self.run(lambda: session.query(CommandRestriction.role, CommandRestriction.command)
+                                  .filter(CommandRestriction.guild_id == guild_id).all())
+
+            restrictions = self.restrictions.load(guild_id, rows)
+
+        return restrictions
+
+    async def offset_reminders(self, offset: int, *, guild_id: typing.Optional[int] = None,
+                               channel: typing.Optional[int] = None, dm_channel_id: typing.Optional[int] = None) -> int:
+        # shift reminders with a single UPDATE. guild_id scopes to a guild (internal id) and channel optionally
+        # narrows that to one channel (snowflake); dm_channel_id targets a user's DM reminders instead
+        def _offset() -> int:
+            reminders = session.query(Reminder)
+
+            if dm_channel_id is not None:
+                reminders = reminders.filter(Reminder.channel_id == dm_channel_id)
+
+            else:
+                channels = session.query(Channel.id).filter(Channel.guild_id == guild_id)
+
+                if channel is not None:
+                    channels = channels.filter(Channel.channel == channel)
+
+                reminders = reminders.filter(Reminder.channel_id.in_(channels.subquery()))
+
+            count = reminders.update({Reminder.time: Reminder.time + offset}, synchronize_session=False)
+            session.commit()
+
+            return count
+
+        return await self.run(_offset)
+
+    async def list_reminders(self, cursor: ReminderCursor, count: int) \
+            -> typing.List[typing.Tuple[int, int, bool, str]]:
+        # the next `count` reminders after the cursor as (id, time, enabled, content), with the message and embed
+        # joined in so no row costs a further query
+        def _list():
+            query = session.query(Reminder.id, Reminder.time, Reminder.enabled, Message.content, Embed.description) \
+                .join(Message, Reminder.message_id == Message.id) \
+                .outerjoin(Embed, Message.embed_id == Embed.id) \
+                .filter(Reminder.channel_id == cursor.channel_id)
+
+            if cursor.enabled_only:
+                query = query.filter(Reminder.enabled == True)  # an equality, so reminders_channel_due gives the order
+
+            if cursor.after is not None:
+                time, reminder_id = cursor.after
+                query = query.filter((Reminder.time > time) | ((Reminder.time == time) & (Reminder.id > reminder_id)))
+
+            return [(reminder_id, time, enabled, content if len(content) > 0 else (description or ''))
+                    for reminder_id, time, enabled, content, description in
+                    query.order_by(Reminder.time, Reminder.id).limit(count)]
+
+        return await self.run(_list)
+
+    async def count_reminders(self, cursor: ReminderCursor, limit: int) -> int:
+        # counts no further than `limit`, so a small listing of a busy channel doesn't scan all of it
+        def _count():
+            query = session.query(Reminder.id).filter(Reminder.channel_id == cursor.channel_id)
+
+            if cursor.enabled_only:
+                query = query.filter(Reminder.enabled == True)
+
+            return query.limit(limit).from_self().count()
+
+        return await self.run(_count)
+
+    async def list_guild_reminders(self, *, guild_id: typing.Optional[int] = None,
+                                   dm_channel_id: typing.Optional[int] = None) \
+            -> typing.List[typing.Tuple[int, str, int]]:
+        # every reminder in a guild (internal id) or a user's DMs as (id, content, channel snowflake), ordered by
+        # channel then time, from a single query over reminders, channels, messages and embeds
+        def _list():
+            query = session.query(Reminder.id, Message.content, Embed.description, Channel.channel) \
+                .join(Channel, Reminder.channel_id == Channel.id) \
+                .join(Message, Reminder.message_id == Message.id) \
+                .outerjoin(Embed, Message.embed_id == Embed.id)
+
+            if dm_channel_id is not None:
+                query = query.filter(Reminder.channel_id == dm_channel_id)
+
+            else:
+                query = query.filter(Channel.guild_id == guild_id)
+
+            return [(reminder_id, content if len(content) > 0 else (description or ''), channel)
+                    for reminder_id, content, description, channel in
+                    query.order_by(Channel.id, Reminder.time, Reminder.id)]
+
+        return await self.run(_list)
+
+    async def delete_reminders(self, reminder_ids: typing.Iterable[int], chunk_size: int = 500) -> int:
+        # deleted a chunk at a time so a large selection doesn't become one enormous IN list, but committed together
+        def _delete() -> int:
+            ids = sorted(reminder_ids)
+            count = 0
+
+            for start in range(0, len(ids), chunk_size):
+                count += session.query(Reminder).filter(Reminder.id.in_(ids[start:start + chunk_size])) \
+                    .delete(synchronize_session=False)
+
+            session.commit()
+
+            return count
+
+        return await self.run(_delete)
+
+    @staticmethod
+    def _todos(user_id: typing.Optional[int], guild_id: typing.Optional[int]):
+        # a user's todo list (internal id) or a guild's
+        if user_id is not None:
+            return session.query(Todo).filter(Todo.user_id == user_id)
+
+        else:
+            return session.query(Todo).filter(Todo.guild_id == guild_id)
+
+    async def list_todos(self, count: int, after: int = 0, *, user_id: typing.Optional[int] = None,
+                         guild_id: typing.Optional[int] = None) -> typing.List[typing.Tuple[int, str]]:
+        # the next `count` items after position `after` as (position, value)
+        def _list():
+            return self._todos(user_id, guild_id).filter(Todo.position > after) \
+                .order_by(Todo.position).limit(count).with_entities(Todo.position, Todo.value).all()
+
+        return await self.run(_list)
+
+    async def add_todo(self, value: str, *, user_id: typing.Optional[int] = None,
+                       guild_id: typing.Optional[int] = None) -> int:
+        # two adds to the same list can't both take the next position: the owner's row is locked while it's read, and
+        # where that isn't enough (sqlite ignores FOR UPDATE) the unique key turns the second away to try again
+        def _add() -> int:
+            for attempt in range(TODO_ATTEMPTS):
+                if user_id is not None:
+                    session.query(User.id).filter(User.id == user_id).with_for_update().first()
+
+                else:
+                    session.query(Guild.id).filter(Guild.id == guild_id).with_for_update().first()
+
+                last = self._todos(user_id, guild_id).with_entities(func.max(Todo.position)).scalar()
+                position = (last or 0) + 1
+
+                session.add(Todo(user_id=user_id, guild_id=guild_id, position=position, value=value))
+
+                try:
+                    session.flush()
+
+                except IntegrityError:
+                    session.rollback()
+
+                    if attempt == TODO_ATTEMPTS - 1:
+                        raise
+
+                else:
+                    return position
+
+        # in a scope of its own, so a retry's rollback can't touch the command's other work
+        return await self.isolated(_add)
+
+    async def remove_todo(self, position: int, *, user_id: typing.Optional[int] = None,
+                          guild_id: typing.Optional[int] = None) -> typing.Optional[str]:
+        # the removed item's value, or None if there's nothing at that position. only that row is touched: the items
+        # after it keep their numbers, so the list is left with a gap rather than renumbered
+        def _remove() -> typing.Optional[str]:
+            item = self._todos(user_id, guild_id).filter(Todo.position == position)
+
+            value = item.with_entities(Todo.value).scalar()
+
+            if value is not None:
+                item.delete(synchronize_session=False)
+                session.commit()
+
+            return value
+
+        return await self.run(_remove)
+
+    async def clear_todos(self, *, user_id: typing.Optional[int] = None,
+                          guild_id: typing.Optional[int] = None) -> int:
+        def _clear() -> int:
+            count = self._todos(user_id, guild_id).delete(synchronize_session=False)
+            session.commit()
+
+            return count
+
+        return await self.run(_clear)
+
+    def forget_guild(self, discord_guild):
+        self.guilds.discard(discord_guild.id)
+        self.restrictions.discard(discord_guild.id)
+        self.blacklists.discard(discord_guild.id)
+
+        for channel in discord_guild.channels:
+            self.channels.discard(channel.id)
+
+    def note_details(self, message, guild: Guild, user: User):
+        # brings the names held for a command's channel, guild and author up to date, and records that the author is
+        # in the guild, the next time the write behind queue is flushed
+        channel = message.channel
+        author = '{}#{}'.format(message.author.name, message.author.discriminator)
+
+        self.write_behind.note('channel', channel.id,
+                               snowflake=channel.id, new_name=channel.name, new_guild_id=guild.id)
+        self.write_behind.note('member', (guild.id, user.id), guild=guild.id, user=user.id)
+
+        if user.name != author:
+            self.write_behind.note('user', user.user, snowflake=user.user, new_name=author)
+
+        if guild.name != message.guild.name:
+            self.write_behind.note('guild', guild.guild, snowflake=guild.guild, new_name=message.guild.name)
+
+    async def get_language(self, code_or_name: str) -> typing.Optional[Language]:
+        return await self.run(self._get_language, code_or_name)
+
+    async def get_languages(self) -> typing.List[Language]:
+        return await self.run(lambda: session.query(Language).all())
+
+    @staticmethod
+    def _get_user(user_id: int) -> typing.Optional[User]:
+        return session.query(User).filter(User.user == user_id).first()
+
+    def _create_user(self, user_id: int, name: str, dm_channel_id: int) -> User:
+        # two messages from a new user can both miss the cache before either creates them. creations are made one at a
+        # time and committed straight away, so checking again here is enough to stop the second inserting a duplicate
+        u = self._get_user(user_id)
+
+        if u is not None:
+            return u
+
+        c = session.query(Channel).filter(Channel.channel == dm_channel_id).first()
+
+        if c is None:
+            c = Channel(channel=dm_channel_id)
+            session.add(c)
+            session.flush()
+
+        u = User(user=user_id, dm_channel=c.id, name=name)
+        session.add(u)
+        session.flush()
+
+        # load the columns the insert left to the database, or every copy of the cached row would query them again
+        session.refresh(u)
+
+        return u
+
+    @staticmethod
+    def _get_or_create_guild(guild_id: int) -> Guild:
+        guild = session.query(Guild).filter(Guild.guild == guild_id).first()
+
+        if guild is None:
+            guild = Guild(guild=guild_id)
+
+            session.add(guild)
+            session.flush()
+            session.refresh(guild)
+
+        return guild
+
+    @staticmethod
+    def _get_or_create_channel(discord_channel) -> (Channel, bool):
+        channel, new = Channel.get_or_create(discord_channel)
+
+        if new:
+            session.refresh(channel)
+
+        return channel, new
+
+    @staticmethod
+    def _get_language(code_or_name: str) -> typing.Optional[Language]:
+        return session.query(Language).filter(
+            (Language.code == code_or_name.upper()) | (Language.name == code_or_name.lower())).first()
@@ -9,6 +9,7 @@ class CreateReminderResponse(Enum):
     SHORT_INTERVAL = 3
     INVALID_TAG = 5
     PAST_TIME = 6
+    NO_WEBHOOK = 7
 
 
 # enumerate possible permission levels for command execution
@@ -26,3 +27,9 @@ class PermissionLevels(IntEnum):
 class TimeExtractionTypes(Enum):
     EXPLICIT = 0
     DISPLACEMENT = 1
+
+
+# order in which replies queued for the same channel are sent. listings go after anything quicker to answer
+class ReplyPriority(IntEnum):
+    INTERACTIVE = 0
+    BULK = 1
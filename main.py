@@ -1,123 +1,179 @@
+# taken before anything else is imported, so the startup breakdown includes the imports
+from time import perf_counter
+STARTED = perf_counter()
+
 import asyncio
-import concurrent.futures
 import itertools
 import re
-from datetime import datetime
-from functools import partial
+import sys
+from datetime import datetime, tzinfo
 from json import dumps as json_dump
 from time import time as unix_time
 
 import aiohttp
-import dateparser
 import pytz
+from sqlalchemy import func
 
+from caches import PrefixCache, IdentityCache
+from cluster import Cluster, ClusterLink
 from config import Config
 from consts import *
-from models import Reminder, Todo, Timer, Message, Channel
+from database import Database, ReminderCursor
+from enums import ReplyPriority
+from metrics import Metrics
+from models import Reminder, Timer, Message, Channel, Guild, strings_catalog, engine, create_tables
+from natural_parser import NaturalParser
 from passers import *
+from patreon import PatreonMembership
+from replies import Replies
+from scheduler import ReminderScheduler
 from time_extractor import TimeExtractor, InvalidTime
 
 THEME_COLOR = 0x8fb677
 
+# reminders fetched per query when listing, and messages sent per look before the rest is left for `look next`
+LOOK_BATCH = 100
+LOOK_PAGES = 5
+# todo items fetched per query when listing
+TODO_BATCH = 200
 
-class BotClient(discord.AutoShardedClient):
-    def __init__(self, *args, **kwargs):
-        self.start_time: float = unix_time()
 
-        self.commands: typing.Dict[str, Command] = {
+def command_pattern(user_id: int, command_names: typing.Iterable[str]) -> typing.Pattern:
+    # a command is a mention of the bot or a prefix of up to 5 characters, then the command name and its arguments
+    return re.compile(
+        r'(?:(?:<@ID>\s+)|(?:<@!ID>\s+)|(?P<prefix>\S{1,5}?))(?P<cmd>COMMANDS)(?:$|\s+(?P<args>.*))'
+        .replace('ID', str(user_id)).replace('COMMANDS', '|'.join(command_names)),
+        re.MULTILINE | re.DOTALL | re.IGNORECASE
+    )
+
+
+def command_table(client) -> typing.Dict[str, Command]:
+    # command name -> Command for each of the client's handlers. the benchmarks pass BotClient itself, since they only
+    # need the names
+    return {
+
+        'help': Command('help', client.help, blacklists=False),
+        'info': Command('info', client.info),
+        'donate': Command('donate', client.donate),
+
+        'prefix': Command('prefix', client.change_prefix, False, PermissionLevels.RESTRICTED),
+        'blacklist': Command('blacklist', client.blacklist, False, PermissionLevels.RESTRICTED, blacklists=False),
+        # TODO: remodel restriction table with FKs for role table
+        'restrict': Command('restrict', client.restrict, False, PermissionLevels.RESTRICTED),
+
+        'timezone': Command('timezone', client.set_timezone),
+        'lang': Command('lang', client.set_language),
+        'clock': Command('clock', client.clock),
+
+        'offset': Command('offset', client.offset_reminders, True, PermissionLevels.RESTRICTED),
+        'nudge': Command('nudge', client.nudge_channel, True, PermissionLevels.RESTRICTED),
+
+        'natural': Command('natural', client.natural, True, PermissionLevels.MANAGED),
+        'n': Command('natural', client.natural, True, PermissionLevels.MANAGED),
+        'remind': Command('remind', client.remind_cmd, True, PermissionLevels.MANAGED),
+        'r': Command('remind', client.remind_cmd, True, PermissionLevels.MANAGED),
+        'interval': Command('interval', client.interval_cmd, True, PermissionLevels.MANAGED),
+        # TODO: remodel timer table with FKs for guild table
+        'timer': Command('timer', client.timer, False, PermissionLevels.MANAGED),
+        'del': Command('del', client.delete, True, PermissionLevels.MANAGED),
+        # TODO: allow looking at reminder attributes in full by name
+        'look': Command('look', client.look, True, PermissionLevels.MANAGED),
+
+        'todos': Command('todos', client.todo, False, PermissionLevels.MANAGED),
+        'todo': Command('todo', client.todo),
+
+        'ping': Command('ping', client.time_stats)
+    }
+
+
+def look_line(content: str, inter: str, time: int, timezone: tzinfo, enabled: bool) -> str:
+    return '\'{}\' *{}* **{}** {}\n'.format(
+        content,
+        inter,
+        datetime.fromtimestamp(time, timezone).strftime('%Y-%m-%d %H:%M:%S'),
+        '' if enabled else '`disabled`')
+
 
-            'help': Command('help', self.help, blacklists=False),
-            'info': Command('info', self.info),
-            'donate': Command('donate', self.donate),
+def del_line(count: int, content: str, channel: int) -> str:
+    return '''**{}**: '{}' *<#{}>*\n'''.format(count, content, channel)
 
-            'prefix': Command('prefix', self.change_prefix, False, PermissionLevels.RESTRICTED),
-            'blacklist': Command('blacklist', self.blacklist, False, PermissionLevels.RESTRICTED, blacklists=False),
-            # TODO: remodel restriction table with FKs for role table
-            'restrict': Command('restrict', self.restrict, False, PermissionLevels.RESTRICTED),
 
-            'timezone': Command('timezone', self.set_timezone),
-            'lang': Command('lang', self.set_language),
-            'clock': Command('clock', self.clock),
+def paginate(lines: typing.Iterable[str], size: int = 2000) -> typing.Iterator[str]:
+    # join lines into pages of at most `size` characters, yielding each page as soon as it is full
+    page = ''
 
-            'offset': Command('offset', self.offset_reminders, True, PermissionLevels.RESTRICTED),
-            'nudge': Command('nudge', self.nudge_channel, True, PermissionLevels.RESTRICTED),
+    for line in lines:
+        if len(page) + len(line) > size and len(page) > 0:
+            yield page
+            page = line
 
-            'natural': Command('natural', self.natural, True, PermissionLevels.MANAGED),
-            'n': Command('natural', self.natural, True, PermissionLevels.MANAGED),
-            'remind': Command('remind', self.remind_cmd, True, PermissionLevels.MANAGED),
-            'r': Command('remind', self.remind_cmd, True, PermissionLevels.MANAGED),
-            'interval': Command('interval', self.interval_cmd, True, PermissionLevels.MANAGED),
-            # TODO: remodel timer table with FKs for guild table
-            'timer': Command('timer', self.timer, False, PermissionLevels.MANAGED),
-            'del': Command('del', self.delete, True, PermissionLevels.MANAGED),
-            # TODO: allow looking at reminder attributes in full by name
-            'look': Command('look', self.look, True, PermissionLevels.MANAGED),
+        else:
+            page += line
+
+    if len(page) > 0:
+        yield page
+
+
+class BotClient(discord.AutoShardedClient):
+    def __init__(self, *args, cluster: typing.Optional[ClusterLink] = None, **kwargs):
+        self.start_time: float = unix_time()
 
-            'todos': Command('todos', self.todo, False, PermissionLevels.MANAGED),
-            'todo': Command('todo', self.todo),
+        self.metrics: Metrics = Metrics(started=STARTED)
+        self.metrics.startup.mark('imports')
 
-            'ping': Command('ping', self.time_stats)
-        }
+        # set when this process runs a share of the shards under cluster.Cluster
+        self.cluster: typing.Optional[ClusterLink] = cluster
+
+        self.commands: typing.Dict[str, Command] = command_table(self)
 
         self.match_string = None
 
         self.command_names = set(self.commands.keys())
-        self.joined_names = '|'.join(self.command_names)
 
         # used in restrict command for filtration
         self.max_command_length = max(len(x) for x in self.command_names)
 
         self.config: Config = Config(filename='config.ini')
 
-        self.executor: concurrent.futures.ThreadPoolExecutor = concurrent.futures.ThreadPoolExecutor()
+        self.natural_parser: NaturalParser = NaturalParser(
+            workers=self.config.natural_workers, timeout=self.config.natural_timeout)
+        self.db: Database = Database(workers=self.config.database_workers, write_interval=self.config.write_interval)
+        self.metrics.install(engine)
+        self.prefixes: PrefixCache = PrefixCache()
+        # (user, channel) -> where their last look stopped
+        self.look_cursors: IdentityCache = IdentityCache(1000)
+        self.replies: Replies = Replies()
+        self.scheduler: ReminderScheduler = ReminderScheduler(
+            self.load_due_reminders, self.deliver_reminder, window=self.config.scheduler_window)
         self.c_session: typing.Optional[aiohttp.ClientSession] = None
+        self.patreon: PatreonMembership = PatreonMembership(
+            self.config.patreon_server, self.config.patreon_role, self.config.token)
 
         super(BotClient, self).__init__(*args, **kwargs)
 
-    async def do_blocking(self, method):
-        # perform a long running process within a threadpool
-        a, _ = await asyncio.wait([self.loop.run_in_executor(self.executor, method)])
-        return [x.result() for x in a][0]
+        self.metrics.startup.mark('client')
 
     async def find_and_create_member(self, member_id: int, context_guild: typing.Optional[discord.Guild]) \
             -> typing.Optional[User]:
-        u: User = session.query(User).filter(User.user == member_id).first()
+        u: User = await self.db.get_user(member_id)
 
         if u is None and context_guild is not None:
             m = context_guild.get_member(member_id) or self.get_user(member_id)
 
             if m is not None:
-                c = Channel(channel=(await m.create_dm()).id)
-                session.add(c)
-                session.flush()
-
-                u = User(user=m.id, name='{}'.format(m), dm_channel=c.id)
-
-                session.add(u)
-                session.commit()
+                u = await self.db.create_user(m.id, '{}'.format(m), (await m.create_dm()).id)
 
         return u
 
+    def reply(self, message, content: typing.Optional[str] = None, *,
+              priority: ReplyPriority = ReplyPriority.INTERACTIVE, **kwargs) -> asyncio.Future:
+        # queued rather than sent, so a command isn't held up by discord between its messages. listings are sent with
+        # BULK priority, so other commands' replies in the same channel don't wait behind all of their pages
+        return self.replies.send(message.channel, content, priority=priority, **kwargs)
+
     async def is_patron(self, member_id) -> bool:
         if self.config.patreon_enabled:
-
-            url = 'https://discordapp.com/api/v6/guilds/{}/members/{}'.format(self.config.patreon_server, member_id)
-
-            head = {
-                'authorization': 'Bot {}'.format(self.config.token),
-                'content-type': 'application/json'
-            }
-
-            async with self.c_session.get(url, headers=head) as resp:
-
-                if resp.status == 200:
-                    member = await resp.json()
-                    roles = [int(x) for x in member['roles']]
-
-                else:
-                    return False
-
-            return self.config.patreon_role in roles
+            return await self.patreon.is_patron(member_id)
 
         else:
             return True
@@ -133,39 +189,217 @@ class BotClient(discord.AutoShardedClient):
             else:
                 continue
 
-    async def on_error(self, *a, **k):
-        session.rollback()
-        raise
+    async def close(self):
+        # names and memberships still waiting in the write behind queue would go with the process
+        try:
+            await self.db.write_behind.flush()
+
+        except Exception as e:
+            print('Failed to write {} updates on close: {}'.format(len(self.db.write_behind), e))
+
+        await super(BotClient, self).close()
 
     async def on_ready(self):
+        self.metrics.startup.mark('connect')
 
         print('Logged in as')
         print(self.user.name)
         print(self.user.id)
 
-        self.match_string = \
-            r'(?:(?:<@ID>\s+)|(?:<@!ID>\s+)|(?P<prefix>\S{1,5}?))(?P<cmd>COMMANDS)(?:$|\s+(?P<args>.*))' \
-            .replace('ID', str(self.user.id)).replace('COMMANDS', self.joined_names)
+        self.match_string = command_pattern(self.user.id, self.command_names)
 
         self.c_session: aiohttp.client.ClientSession = aiohttp.ClientSession()
 
         if self.config.patreon_enabled:
             print('Patreon is enabled. Will look for servers {}'.format(self.config.patreon_server))
 
+            self.patreon.start(self.c_session)
+
         print('Local timezone set to *{}*'.format(self.config.local_timezone))
 
+        async with self.db.scope():
+            await self.db.run(strings_catalog.reload)
+        print('Loaded {} strings'.format(len(strings_catalog)))
+
+        self.natural_parser.start(strings_catalog.codes())
+        self.metrics.startup.mark('strings')
+
+        async with self.db.scope():
+            self.prefixes.load(await self.db.get_prefixes())
+        print('Cached prefixes for {} guilds'.format(len(self.prefixes)))
+        self.metrics.startup.mark('prefixes')
+
+        if not self.metrics.startup.finished:
+            print('Started in {}'.format(self.metrics.startup.finish()))
+
+        if self.config.scheduler_enabled:
+            self.scheduler.start()
+            print('Delivering reminders in process. The postman should not be running')
+
+        self.db.write_behind.start()
+
+        if self.config.metrics_port:
+            await self.metrics.start(self.config.metrics_host, self.config.metrics_port)
+            print('Serving metrics on {}:{}'.format(self.config.metrics_host, self.config.metrics_port))
+
+        if self.cluster is not None:
+            self.cluster.set_guilds(len(self.guilds))
+            self.cluster.listen(self.apply_invalidation)
+
+    def publish(self, kind: str, *args):
+        # tell the other processes of the cluster that a cached row has changed
+        if self.cluster is not None:
+            self.cluster.publish(kind, *args)
+
+    async def apply_invalidation(self, kind: str, *args):
+        if kind == 'prefix':
+            guild_id, prefix = args
+
+            self.prefixes.set(guild_id, prefix)
+            self.db.guilds.discard(guild_id)
+
+        elif kind == 'guild':
+            self.db.guilds.discard(args[0])
+
+        elif kind == 'channel':
+            self.db.channels.discard(args[0])
+
+        elif kind == 'user':
+            self.db.users.discard(args[0])
+
+        elif kind == 'restrictions':
+            self.db.restrictions.discard(args[0])
+
+        elif kind == 'blacklist':
+            self.db.blacklists.discard(args[0])
+
+    def schedules(self, guild_id: typing.Optional[int]) -> bool:
+        # with the shards split over processes, a reminder is delivered only by the process running its guild's shard.
+        # reminders in DMs, or in channels with no guild recorded, belong to shard 0, which is where discord sends DMs
+        if self.cluster is None:
+            return True
+
+        shard = 0 if guild_id is None else (guild_id >> 22) % self.shard_count
+
+        return shard in self.shard_ids
+
+    async def load_due_reminders(self, start: int, end: int) -> typing.List[typing.Tuple[int, int]]:
+        def _load():
+            query = session.query(Reminder.id, Reminder.time) \
+                .filter(Reminder.enabled == True) \
+                .filter(Reminder.time >= start) \
+                .filter(Reminder.time <= end)
+
+            if self.cluster is not None:
+                # the same split as schedules: a guild's shard is its snowflake shifted down 22 bits, modulo the count
+                shard = func.coalesce(Guild.guild.op('>>')(22) % self.shard_count, 0)
+
+                query = query.join(Channel, Reminder.channel_id == Channel.id) \
+                    .outerjoin(Guild, Channel.guild_id == Guild.id) \
+                    .filter(shard.in_(self.shard_ids))
+
+            return query.all()
+
+        async with self.db.scope():
+            return await self.db.run(_load)
+
+    async def deliver_reminder(self, reminder_id: int):
+        # offset and del change reminders with bulk statements that bypass the session, so always read the row
+        def _load():
+            r: typing.Optional[Reminder] = session.query(Reminder).populate_existing().get(reminder_id)
+
+            if r is None or not r.enabled:
+                return None, None
+
+            # moved to a later time since it was queued, by a process whose push couldn't reach this scheduler
+            elif r.time > unix_time():
+                return r.time, None
+
+            embed: typing.Optional[discord.Embed] = None
+            if r.message.embed is not None:
+                embed = discord.Embed(title=r.message.embed.title, description=r.message.embed.description,
+                                      color=r.message.embed.color or discord.Embed.Empty)
+
+            return None, (r.message.content, embed, r.username, r.avatar, r.channel)
+
+        def _complete() -> typing.Optional[int]:
+            r: typing.Optional[Reminder] = session.query(Reminder).populate_existing().get(reminder_id)
+
+            if r is None:
+                return None
+
+            elif r.interval:
+                # skip any repeats that were missed while the bot was offline
+                while r.time <= unix_time():
+                    r.time += r.interval
+
+                session.commit()
+                return r.time
+
+            else:
+                session.delete(r)
+                session.commit()
+
+        async with self.db.scope():
+            due, reminder = await self.db.run(_load)
+
+        if reminder is None:
+            if due is not None:
+                self.scheduler.push(reminder_id, due)
+
+            return
+
+        content, embed, username, avatar, channel = reminder
+
+        try:
+            if channel.webhook_id is not None and channel.webhook_token is not None:
+                webhook = discord.Webhook.partial(channel.webhook_id, channel.webhook_token,
+                                                  adapter=discord.AsyncWebhookAdapter(self.c_session))
+
+                await webhook.send(content, embed=embed, username=username, avatar_url=avatar)
+
+            else:
+                await self.http.send_message(channel.channel, content, embed=None if embed is None else embed.to_dict())
+
+        # a channel or webhook that's gone, or that the bot can't post in, won't come back by itself, so the reminder is
+        # dealt with as if it was sent. anything else, like a 429 or a 5xx, is raised so the scheduler tries again
+        except (discord.Forbidden, discord.NotFound) as e:
+            print('Reminder {} could not be sent to {}: {}'.format(reminder_id, channel, e))
+
+        async with self.db.scope():
+            next_time = await self.db.run(_complete)
+
+        if next_time is not None:
+            self.scheduler.push(reminder_id, next_time)
+
     async def on_guild_join(self, guild):
+        if self.cluster is not None:
+            self.cluster.set_guilds(len(self.guilds))
+
         await self.send()
 
         await self.welcome(guild)
 
-    # noinspection PyMethodMayBeStatic
+    async def on_guild_remove(self, guild):
+        self.db.forget_guild(guild)
+
+        if self.cluster is not None:
+            self.cluster.set_guilds(len(self.guilds))
+
     async def on_guild_channel_delete(self, channel):
-        session.query(Channel).filter(Channel.channel == channel.id).delete(synchronize_session='fetch')
+        self.db.channels.discard(channel.id)
+
+        def _delete():
+            session.query(Channel).filter(Channel.channel == channel.id).delete(synchronize_session='fetch')
+            session.commit()
+
+        async with self.db.scope():
+            await self.db.run(_delete)
 
     async def send(self):
         if self.config.dbl_token:
-            guild_count = len(self.guilds)
+            # the whole cluster's guilds, not just those on this process's shards
+            guild_count = len(self.guilds) if self.cluster is None else self.cluster.total_guilds()
 
             dump = json_dump({
                 'server_count': guild_count
@@ -189,24 +423,18 @@ class BotClient(discord.AutoShardedClient):
             return p.send_messages and p.embed_links
 
         async def _get_user(_message):
-            _user = session.query(User).filter(User.user == message.author.id).first()
+            _user = await self.db.get_user(_message.author.id)
             if _user is None:
-                dm_channel_id = (await message.author.create_dm()).id
-
-                c = session.query(Channel).filter(Channel.channel == dm_channel_id).first()
+                dm_channel_id = (await _message.author.create_dm()).id
 
-                if c is None:
-                    c = Channel(channel=dm_channel_id)
-                    session.add(c)
-                    session.flush()
-
-                    _user = User(user=_message.author.id, dm_channel=c.id, name='{}#{}'.format(
-                        _message.author.name, _message.author.discriminator))
-                    session.add(_user)
-                    session.flush()
+                _user = await self.db.create_user(_message.author.id, '{}#{}'.format(
+                    _message.author.name, _message.author.discriminator), dm_channel_id)
 
             return _user
 
+        if message.author.bot or message.content is None:
+            return
+
         elif message.guild is None:
             # command has been DMed. dont check for prefix :)
             split = message.content.split(' ')
@@ -221,36 +449,30 @@ class BotClient(discord.AutoShardedClient):
                 command = self.commands[command_word]
 
                 if command.allowed_dm:
-                    # get user
-                    user = await _get_user(message)
+                    async with self.db.scope():
+                        # get user
+                        user = await _get_user(message)
 
-                    await command.func(message, args, Preferences(None, user))
-                    session.commit()
+                        with self.metrics.track(command.name):
+                            await command.func(message, args, Preferences(None, user))
+                            await self.db.commit()
 
         elif _check_self_permissions(message.channel):
             # command sent in guild. check for prefix & call
-            match = re.match(
-                self.match_string,
-                message.content,
-                re.MULTILINE | re.DOTALL | re.IGNORECASE
-            )
-
-            if match is not None:
-                # matched command structure; now query for guild to compare prefix
-                guild = session.query(Guild).filter(Guild.guild == message.guild.id).first()
-                if guild is None:
-                    guild = Guild(guild=message.guild.id)
+            match = self.match_string.match(message.content)
 
-                    session.add(guild)
-                    session.flush()
+            # if prefix is none, suggests mention has been provided instead since pattern still matched. compare
+            # against the cached prefix so ordinary chat is turned away before anything reaches the database
+            if match is not None and (prefix := match.group('prefix')) in (self.prefixes.get(message.guild.id), None):
+                # everything from here on works in a session of its own, so commands running at once don't share
+                # (and commit or roll back) each other's unfinished work
+                async with self.db.scope():
+                    guild = await self.db.get_or_create_guild(message.guild.id)
 
-                # if none, suggests mention has been provided instead since pattern still matched
-                if (prefix := match.group('prefix')) in (guild.prefix, None):
                     # prefix matched, might as well get the user now since this is a very small subset of messages
                     user = await _get_user(message)
 
-                    if guild not in user.guilds:
-                        guild.users.append(user)
+                    self.db.note_details(message, guild, user)
 
                     # create the nice info manager
                     info = Preferences(guild, user)
@@ -261,28 +483,24 @@ class BotClient(discord.AutoShardedClient):
 
                     # some commands dont get blacklisted e.g help, blacklist
                     if command.blacklists:
-                        channel, just_created = Channel.get_or_create(message.channel)
-
-                        if channel.guild_id is None:
-                            channel.guild_id = guild.id
-
-                        if channel.blacklisted:
-                            await message.channel.send(
-                                embed=discord.Embed(description=info.language.get_string('blacklisted')))
+                        if message.channel.id in await self.db.get_blacklist(message.guild):
+                            self.reply(
+                                message, embed=discord.Embed(description=info.language.get_string('blacklisted')))
                             return
 
                     # blacklist checked; now do command permissions
-                    if command.check_permissions(message.author, guild):
+                    if command.check_permissions(message.author, await self.db.get_restrictions(message.guild.id)):
                         if message.guild.me.guild_permissions.manage_webhooks:
-                            await command.func(message, stripped, info)
-                            session.commit()
+                            with self.metrics.track(command.name):
+                                await command.func(message, stripped, info)
+                                await self.db.commit()
 
                         else:
-                            await message.channel.send(info.language.get_string('no_perms_webhook'))
+                            self.reply(message, info.language.get_string('no_perms_webhook'))
 
                     else:
-                        await message.channel.send(
-                            info.language.get_string(
+                        self.reply(
+                            message, info.language.get_string(
                                 str(command.permission_level)).format(prefix=prefix))
 
         else:
@@ -293,7 +511,7 @@ class BotClient(discord.AutoShardedClient):
 
         message_ts: float = message.created_at.timestamp()
 
-        m: discord.Message = await message.channel.send('.')
+        m: discord.Message = await self.reply(message, '.', merge=False)
 
         ping: float = m.created_at.timestamp() - message_ts
 
@@ -302,28 +520,25 @@ class BotClient(discord.AutoShardedClient):
         Ping: {}ms
         '''.format(round(uptime), round(ping * 1000)))
 
-    @staticmethod
-    async def help(message, _stripped, preferences):
-        await message.channel.send(embed=discord.Embed(
+    async def help(self, message, _stripped, preferences):
+        self.reply(message, embed=discord.Embed(
             description=preferences.language.get_string('help'),
             color=THEME_COLOR
         ))
 
     async def info(self, message, _stripped, preferences):
-        await message.channel.send(embed=discord.Embed(
+        self.reply(message, embed=discord.Embed(
             description=preferences.language.get_string('info').format(prefix=preferences.prefix, user=self.user.name),
             color=THEME_COLOR
         ))
 
-    @staticmethod
-    async def donate(message, _stripped, preferences):
-        await message.channel.send(embed=discord.Embed(
+    async def donate(self, message, _stripped, preferences):
+        self.reply(message, embed=discord.Embed(
             description=preferences.language.get_string('donate'),
             color=THEME_COLOR
         ))
 
-    @staticmethod
-    async def change_prefix(message, stripped, preferences):
+    async def change_prefix(self, message, stripped, preferences):
 
         if stripped:
 
@@ -331,22 +546,24 @@ class BotClient(discord.AutoShardedClient):
             new = stripped[:stripped.find(' ')]
 
             if len(new) > 5:
-                await message.channel.send(preferences.language.get_string('prefix/too_long'))
+                self.reply(message, preferences.language.get_string('prefix/too_long'))
 
             else:
                 preferences.prefix = new
 
-                await message.channel.send(preferences.language.get_string('prefix/success').format(
+                self.reply(message, preferences.language.get_string('prefix/success').format(
                     prefix=preferences.prefix))
 
         else:
-            await message.channel.send(preferences.language.get_string('prefix/no_argument').format(
+            self.reply(message, preferences.language.get_string('prefix/no_argument').format(
                 prefix=preferences.prefix))
 
-        session.commit()
+        await self.db.commit()
 
-    @staticmethod
-    async def set_timezone(message, stripped, preferences):
+        self.prefixes.set(message.guild.id, preferences.prefix)
+        self.publish('prefix', message.guild.id, preferences.prefix)
+
+    async def set_timezone(self, message, stripped, preferences):
 
         if message.guild is not None and message.author.guild_permissions.manage_guild:
             s = 'timezone/set'
@@ -356,14 +573,14 @@ class BotClient(discord.AutoShardedClient):
             admin = False
 
         if stripped == '':
-            await message.channel.send(embed=discord.Embed(
+            self.reply(message, embed=discord.Embed(
                 description=preferences.language.get_string('timezone/no_argument').format(
                     prefix=preferences.prefix, timezone=preferences.timezone)))
 
         else:
             if stripped not in pytz.all_timezones:
-                await message.channel.send(
-                    embed=discord.Embed(description=preferences.language.get_string('timezone/no_timezone')))
+                self.reply(
+                    message, embed=discord.Embed(description=preferences.language.get_string('timezone/no_timezone')))
             else:
                 if admin:
                     preferences.server_timezone = stripped
@@ -372,45 +589,50 @@ class BotClient(discord.AutoShardedClient):
 
                 d = datetime.now(pytz.timezone(stripped))
 
-                await message.channel.send(embed=discord.Embed(
+                self.reply(message, embed=discord.Embed(
                     description=preferences.language.get_string(s).format(
                         timezone=stripped, time=d.strftime('%H:%M:%S'))))
 
-                session.commit()
+                await self.db.commit()
 
-    @staticmethod
-    async def set_language(message, stripped, preferences):
+                if admin:
+                    self.publish('guild', message.guild.id)
+                else:
+                    self.publish('user', message.author.id)
+
+    async def set_language(self, message, stripped, preferences):
 
-        new_lang = session.query(Language).filter(
-            (Language.code == stripped.upper()) | (Language.name == stripped.lower())).first()
+        new_lang = await self.db.get_language(stripped)
 
         if new_lang is not None:
             preferences.language = new_lang.code
 
-            await message.channel.send(embed=discord.Embed(description=new_lang.get_string('lang/set_p')))
+            self.reply(message, embed=discord.Embed(description=new_lang.get_string('lang/set_p')))
 
-            session.commit()
+            await self.db.commit()
+
+            self.publish('user', message.author.id)
 
         else:
-            await message.channel.send(
-                embed=discord.Embed(description=preferences.language.get_string('lang/invalid').format(
+            self.reply(
+                message, embed=discord.Embed(description=preferences.language.get_string('lang/invalid').format(
                     '\n'.join(
-                        ['{} ({})'.format(lang.name.title(), lang.code.upper()) for lang in session.query(Language)])
+                        ['{} ({})'.format(lang.name.title(), lang.code.upper())
+                         for lang in await self.db.get_languages()])
                 )
                 )
             )
 
-    @staticmethod
-    async def clock(message, _stripped, preferences):
+    async def clock(self, message, _stripped, preferences):
 
         t = datetime.now(pytz.timezone(preferences.timezone))
 
-        await message.channel.send(preferences.language.get_string('clock/time').format(t.strftime('%H:%M:%S')))
+        self.reply(message, preferences.language.get_string('clock/time').format(t.strftime('%H:%M:%S')))
 
     async def natural(self, message, stripped, server):
 
         if len(stripped.split(server.language.get_string('natural/send'))) < 2:
-            await message.channel.send(embed=discord.Embed(
+            self.reply(message, embed=discord.Embed(
                 description=server.language.get_string('natural/no_argument').format(prefix=server.prefix)))
             return
 
@@ -418,16 +640,16 @@ class BotClient(discord.AutoShardedClient):
 
         time_crop = stripped.split(server.language.get_string('natural/send'))[0]
         message_crop = stripped.split(server.language.get_string('natural/send'), 1)[1]
-        datetime_obj = await self.do_blocking(partial(dateparser.parse, time_crop, settings={
+        datetime_obj = await self.natural_parser.parse(time_crop, {
             'TIMEZONE': server.timezone,
             'TO_TIMEZONE': self.config.local_timezone,
             'RELATIVE_BASE': datetime.now(pytz.timezone(server.timezone)).replace(tzinfo=None),
             'PREFER_DATES_FROM': 'future'
-        }))
+        })
 
         if datetime_obj is None:
-            await message.channel.send(
-                embed=discord.Embed(description=server.language.get_string('natural/invalid_time')))
+            self.reply(
+                message, embed=discord.Embed(description=server.language.get_string('natural/invalid_time')))
             return
 
         if message.guild is not None:
@@ -442,7 +664,7 @@ class BotClient(discord.AutoShardedClient):
         interval: int = 0
 
         if len(interval_split) > 1:
-            interval_dt = await self.do_blocking(partial(dateparser.parse, '1 ' + interval_split[-1]))
+            interval_dt = await self.natural_parser.parse('1 ' + interval_split[-1])
 
             if interval_dt is None:
                 pass
@@ -455,18 +677,14 @@ class BotClient(discord.AutoShardedClient):
                 message_crop = message_crop.rsplit(server.language.get_string('natural/every'), 1)[0]
 
             else:
-                await message.channel.send(embed=discord.Embed(
+                self.reply(message, embed=discord.Embed(
                     description=server.language.get_string('interval/donor').format(prefix=server.prefix)))
                 return
 
         mtime: int = int(datetime_obj.timestamp())
-        responses: typing.List[ReminderInformation] = []
 
-        for location_id in location_ids:
-            response: ReminderInformation = await self.create_reminder(message, location_id, message_crop, mtime,
-                                                                       interval=interval if recurring else None,
-                                                                       method='natural')
-            responses.append(response)
+        responses: typing.List[ReminderInformation] = await self.create_reminders(
+            message, location_ids, message_crop, mtime, interval=interval if recurring else None, method='natural')
 
         if len(responses) == 1:
             result: ReminderInformation = responses[0]
@@ -476,13 +694,13 @@ class BotClient(discord.AutoShardedClient):
                                                                  offset=int(result.time - unix_time()),
                                                                  min_interval=MIN_INTERVAL, max_time=MAX_TIME_DAYS)
 
-            await message.channel.send(embed=discord.Embed(description=response))
+            self.reply(message, embed=discord.Embed(description=response))
 
         else:
             successes: int = len([r for r in responses if r.status == CreateReminderResponse.OK])
 
-            await message.channel.send(
-                embed=discord.Embed(description=server.language.get_string('natural/bulk_set').format(successes)))
+            self.reply(message, embed=discord.Embed(
+                description=server.language.get_string('natural/bulk_set').format(successes)))
 
     async def remind_cmd(self, message, stripped, server):
         await self.remind(False, message, stripped, server)
@@ -496,17 +714,17 @@ class BotClient(discord.AutoShardedClient):
 
         if len(args) < 2:
             if is_interval:
-                await message.channel.send(embed=discord.Embed(
+                self.reply(message, embed=discord.Embed(
                     description=server.language.get_string('interval/no_argument').format(prefix=server.prefix)))
 
             else:
-                await message.channel.send(embed=discord.Embed(
+                self.reply(message, embed=discord.Embed(
                     description=server.language.get_string('remind/no_argument').format(prefix=server.prefix)))
 
         else:
             if is_interval and not await self.is_patron(message.author.id):
-                await message.channel.send(
-                    embed=discord.Embed(description=server.language.get_string('interval/donor')))
+                self.reply(
+                    message, embed=discord.Embed(description=server.language.get_string('interval/donor')))
 
             else:
                 interval = None
@@ -523,8 +741,8 @@ class BotClient(discord.AutoShardedClient):
                     mtime = time_parser.extract_exact()
 
                 except InvalidTime:
-                    await message.channel.send(
-                        embed=discord.Embed(description=server.language.get_string('remind/invalid_time')))
+                    self.reply(
+                        message, embed=discord.Embed(description=server.language.get_string('remind/invalid_time')))
                 else:
                     if is_interval:
                         i = args.pop(0)
@@ -535,7 +753,7 @@ class BotClient(discord.AutoShardedClient):
                             interval = parser.extract_displacement()
 
                         except InvalidTime:
-                            await message.channel.send(embed=discord.Embed(
+                            self.reply(message, embed=discord.Embed(
                                 description=server.language.get_string('interval/invalid_interval')))
                             return
 
@@ -547,14 +765,21 @@ class BotClient(discord.AutoShardedClient):
                         location=result.location.mention, offset=int(result.time - unix_time()),
                         min_interval=MIN_INTERVAL, max_time=MAX_TIME_DAYS)
 
-                    await message.channel.send(embed=discord.Embed(description=response))
+                    self.reply(message, embed=discord.Embed(description=response))
 
     async def create_reminder(self, message: discord.Message, location: int, text: str, time: int,
                               interval: typing.Optional[int] = None, method: str = 'natural') -> ReminderInformation:
+        return (await self.create_reminders(message, [location], text, time, interval, method))[0]
+
+    async def create_reminders(self, message: discord.Message, locations: typing.List[int], text: str, time: int,
+                               interval: typing.Optional[int] = None, method: str = 'natural') \
+            -> typing.List[ReminderInformation]:
+        # every target is resolved before anything is written, missing webhooks are created concurrently, and all of
+        # the reminders are inserted under a single commit. returns one response per location, in order
         ut: float = unix_time()
 
         if time > ut + MAX_TIME:
-            return ReminderInformation(CreateReminderResponse.LONG_TIME)
+            return [ReminderInformation(CreateReminderResponse.LONG_TIME) for _ in locations]
 
         elif time < ut:
 
@@ -562,80 +787,132 @@ class BotClient(discord.AutoShardedClient):
                 time = int(ut)
 
             else:
-                return ReminderInformation(CreateReminderResponse.PAST_TIME)
+                return [ReminderInformation(CreateReminderResponse.PAST_TIME) for _ in locations]
+
+        if interval is not None:
+            if MIN_INTERVAL > interval:
+                return [ReminderInformation(CreateReminderResponse.SHORT_INTERVAL) for _ in locations]
 
-        channel: typing.Optional[Channel] = None
-        user: typing.Optional[User] = None
+            elif interval > MAX_TIME:
+                return [ReminderInformation(CreateReminderResponse.LONG_INTERVAL) for _ in locations]
 
-        # noinspection PyUnusedLocal
-        discord_channel: typing.Optional[typing.Union[discord.TextChannel, DMChannelId]] = None
+        responses: typing.List[ReminderInformation] = []
+        # (channel, user, time) of each reminder to insert. DM reminders have a user rather than a channel, and their
+        # channel is loaded with the insert
+        targets: typing.List[typing.Tuple[typing.Optional[Channel], typing.Optional[User], int]] = []
+        # where each target's response is, so it can be replaced if the target's webhook can't be made
+        indexes: typing.List[int] = []
+        # keyed by channel id, so a channel named twice still only gets one webhook
+        webhooks: typing.Dict[int, typing.Tuple[Channel, typing.Awaitable[discord.Webhook]]] = {}
 
-        # command fired inside a guild
-        if message.guild is not None:
-            discord_channel = message.guild.get_channel(location)
+        for location in locations:
+            channel: typing.Optional[Channel] = None
+            user: typing.Optional[User] = None
 
-            if discord_channel is not None:  # if not a DM reminder
+            # noinspection PyUnusedLocal
+            discord_channel: typing.Optional[typing.Union[discord.TextChannel, DMChannelId]] = None
+
+            # command fired inside a guild
+            if message.guild is not None:
+                discord_channel = message.guild.get_channel(location)
+
+                if discord_channel is not None:  # if not a DM reminder
+
+                    channel, _ = await self.db.get_or_create_channel(discord_channel)
+
+                    if (channel.webhook_token or channel.webhook_id) is None and channel.id not in webhooks:
+                        webhooks[channel.id] = (channel, discord_channel.create_webhook(name='Reminders'))
+
+                    reminder_time = time + channel.nudge
+
+                else:
+                    user = await self.find_and_create_member(location, message.guild)
 
-                channel, _ = Channel.get_or_create(discord_channel)
+                    if user is None:
+                        responses.append(ReminderInformation(CreateReminderResponse.INVALID_TAG))
+                        continue
 
-                await channel.attach_webhook(discord_channel)
+                    reminder_time = time
 
-                time += channel.nudge
+                    discord_channel = DMChannelId(user.dm_channel, user.user)
 
+            # command fired in a DM; only possible target is the DM itself
             else:
-                user = await self.find_and_create_member(location, message.guild)
+                user = await self.db.get_user(message.author.id)
 
-                if user is None:
-                    return ReminderInformation(CreateReminderResponse.INVALID_TAG)
+                reminder_time = time
 
-                discord_channel = DMChannelId(user.dm_channel, user.user)
+                discord_channel = DMChannelId(user.dm_channel, message.author.id)
 
-        # command fired in a DM; only possible target is the DM itself
-        else:
-            user = User.from_discord(message.author)
-            discord_channel = DMChannelId(user.dm_channel, message.author.id)
+            targets.append((channel, user, reminder_time))
+            indexes.append(len(responses))
+            responses.append(ReminderInformation(CreateReminderResponse.OK, channel=discord_channel, time=reminder_time))
 
-        if interval is not None:
-            if MIN_INTERVAL > interval:
-                return ReminderInformation(CreateReminderResponse.SHORT_INTERVAL)
+        results = await asyncio.gather(*(create for _, create in webhooks.values()), return_exceptions=True)
+        hooks: typing.List[typing.Tuple[Channel, discord.Webhook]] = []
+        failed: typing.Set[int] = set()
 
-            elif interval > MAX_TIME:
-                return ReminderInformation(CreateReminderResponse.LONG_INTERVAL)
+        for (channel_id, (channel, _)), result in zip(webhooks.items(), results):
+            if isinstance(result, BaseException):
+                print('Failed to create a webhook for {}: {}'.format(channel.channel, result))
+                failed.add(channel_id)
 
             else:
+                hooks.append((channel, result))
+
+        # a failed webhook only fails the reminders for its own channel
+        if len(failed) > 0:
+            for (channel, _, _), index in zip(targets, indexes):
+                if channel is not None and channel.id in failed:
+                    responses[index] = ReminderInformation(CreateReminderResponse.NO_WEBHOOK,
+                                                           channel=responses[index].location)
+
+            targets = [target for target in targets if target[0] is None or target[0].id not in failed]
+
+        # reminders going to another process's shards are left for its scheduler to load
+        scheduled = [self.schedules(None if channel is None or channel.guild_id is None else message.guild.id)
+                     for channel, _, _ in targets]
+
+        def _insert() -> typing.List[int]:
+            # the new webhooks are set here rather than on the event loop, where they could land in the middle of
+            # another command's flush, and are committed along with the reminders
+            for channel, hook in hooks:
+                channel.webhook_token = hook.token
+                channel.webhook_id = hook.id
+
+            reminders = [
                 # noinspection PyArgumentList
-                reminder = Reminder(
+                Reminder(
+                    uid=uid,
                     message=Message(content=text),
                     channel=channel or user.channel,
-                    time=time,
+                    time=reminder_time,
                     enabled=True,
                     method=method,
                     interval=interval)
-                session.add(reminder)
-                session.commit()
+                for uid, (channel, user, reminder_time) in zip(Reminder.create_uids(len(targets)), targets)
+            ]
 
-        else:
-            # noinspection PyArgumentList
-            r = Reminder(
-                message=Message(content=text),
-                channel=channel or user.channel,
-                time=time,
-                enabled=True,
-                method=method)
-            session.add(r)
+            session.add_all(reminders)
             session.commit()
 
-        return ReminderInformation(CreateReminderResponse.OK, channel=discord_channel, time=time)
+            return [r.id for r in reminders]
 
-    @staticmethod
-    async def timer(message, stripped, preferences):
+        if len(targets) > 0:
+            for reminder_id, (_, _, reminder_time), push in zip(await self.db.run(_insert), targets, scheduled):
+                if push:
+                    self.scheduler.push(reminder_id, reminder_time)
+
+        return responses
+
+    async def timer(self, message, stripped, preferences):
         owner: int = message.guild.id
 
         if message.guild is None:
             owner = message.author.id
 
         if stripped == 'list':
-            timers = session.query(Timer).filter(Timer.owner == owner)
+            timers = await self.db.run(lambda: session.query(Timer).filter(Timer.owner == owner).all())
 
             e = discord.Embed(title='Timers')
             for timer in timers:
@@ -644,67 +921,79 @@ class BotClient(discord.AutoShardedClient):
                 hours, minutes = divmod(minutes, 60)
                 e.add_field(name=timer.name, value="{:02d}:{:02d}:{:02d}".format(hours, minutes, seconds))
 
-            await message.channel.send(embed=e)
+            self.reply(message, embed=e)
 
         elif stripped.startswith('start'):
-            timers = session.query(Timer).filter(Timer.owner == owner)
+            timers = await self.db.run(lambda: session.query(Timer).filter(Timer.owner == owner).all())
 
-            if timers.count() >= 25:
-                await message.channel.send(preferences.language.get_string('timer/limit'))
+            if len(timers) >= 25:
+                self.reply(message, preferences.language.get_string('timer/limit'))
 
             else:
-                n = stripped.split(' ')[1:2] or 'New timer #{}'.format(timers.count() + 1)
+                n = stripped.split(' ')[1:2] or 'New timer #{}'.format(len(timers) + 1)
 
                 if len(n) > 32:
-                    await message.channel.send(preferences.language.get_string('timer/name_length').format(len(n)))
+                    self.reply(message, preferences.language.get_string('timer/name_length').format(len(n)))
 
                 elif n in [x.name for x in timers]:
-                    await message.channel.send(preferences.language.get_string('timer/unique'))
+                    self.reply(message, preferences.language.get_string('timer/unique'))
 
                 else:
-                    t = Timer(name=n, owner=owner)
-                    session.add(t)
+                    def _start():
+                        session.add(Timer(name=n, owner=owner))
+                        session.commit()
 
-                    session.commit()
+                    await self.db.run(_start)
 
-                    await message.channel.send(preferences.language.get_string('timer/success'))
+                    self.reply(message, preferences.language.get_string('timer/success'))
 
         elif stripped.startswith('delete '):
 
             n = ' '.join(stripped.split(' ')[1:])
 
-            timers = session.query(Timer).filter(Timer.owner == owner).filter(Timer.name == n)
+            def _delete() -> int:
+                deleted = session.query(Timer).filter(Timer.owner == owner).filter(Timer.name == n) \
+                    .delete(synchronize_session='fetch')
+                session.commit()
 
-            if timers.count() < 1:
-                await message.channel.send(preferences.language.get_string('timer/not_found'))
+                return deleted
 
-            else:
-                timers.delete(synchronize_session='fetch')
-                await message.channel.send(preferences.language.get_string('timer/deleted'))
+            if await self.db.run(_delete) < 1:
+                self.reply(message, preferences.language.get_string('timer/not_found'))
 
-                session.commit()
+            else:
+                self.reply(message, preferences.language.get_string('timer/deleted'))
 
         else:
-            await message.channel.send(preferences.language.get_string('timer/help'))
+            self.reply(message, preferences.language.get_string('timer/help'))
 
-    @staticmethod
-    async def blacklist(message, _, preferences):
+    async def blacklist(self, message, _, preferences):
 
         target_channel = message.channel_mentions[0] if len(message.channel_mentions) > 0 else message.channel
 
-        channel, _ = Channel.get_or_create(target_channel)
+        channel, _ = await self.db.get_or_create_channel(target_channel)
+        blacklisted = target_channel.id not in await self.db.get_blacklist(message.guild)
+
+        def _set():
+            channel.blacklisted = blacklisted
+            session.commit()
+
+        await self.db.run(_set)
 
-        channel.blacklisted = not channel.blacklisted
+        if blacklisted:
+            self.db.blacklists.add(message.guild.id, target_channel.id)
 
-        if channel.blacklisted:
-            await message.channel.send(
-                embed=discord.Embed(description=preferences.language.get_string('blacklist/added')))
+            self.reply(
+                message, embed=discord.Embed(description=preferences.language.get_string('blacklist/added')))
 
         else:
-            await message.channel.send(
-                embed=discord.Embed(description=preferences.language.get_string('blacklist/removed')))
+            self.db.blacklists.remove(message.guild.id, target_channel.id)
 
-        session.commit()
+            self.reply(
+                message, embed=discord.Embed(description=preferences.language.get_string('blacklist/removed')))
+
+        self.publish('channel', target_channel.id)
+        self.publish('blacklist', message.guild.id)
 
     async def restrict(self, message, stripped, preferences):
 
@@ -712,15 +1001,17 @@ class BotClient(discord.AutoShardedClient):
 
         args: typing.List[str] = re.findall(r'([a-z]+)', stripped)
 
+        restrictions = await self.db.get_restrictions(message.guild.id)
+
         if len(args) == 0:
             if role_tag is None:
                 # no parameters given so just show existing
-                await message.channel.send(
-                    embed=discord.Embed(
+                self.reply(
+                    message, embed=discord.Embed(
                         description=preferences.language.get_string('restrict/allowed').format(
                             '\n'.join(
-                                ['<@&{}> can use `{}`'.format(r.role, r.command)
-                                 for r in preferences.command_restrictions]
+                                ['<@&{}> can use `{}`'.format(role, command)
+                                 for role, commands in restrictions.items() for command in sorted(commands)]
                             )
                         )
                     )
@@ -728,169 +1019,189 @@ class BotClient(discord.AutoShardedClient):
 
             else:
                 # only a role is given so delete all the settings for this role
-                preferences.command_restrictions.filter(CommandRestriction.role == int(role_tag.group(1))).delete(
-                    synchronize_session='fetch')
-                await message.channel.send(
-                    embed=discord.Embed(description=preferences.language.get_string('restrict/disabled')))
+                role_id: int = int(role_tag.group(1))
+
+                def _remove():
+                    preferences.command_restrictions.filter(CommandRestriction.role == role_id) \
+                        .delete(synchronize_session='fetch')
+                    session.commit()
+
+                await self.db.run(_remove)
+
+                # the index only changes once the rows are gone, so a failed commit can't leave it out of step
+                self.db.restrictions.remove_role(message.guild.id, role_id)
+
+                self.reply(
+                    message, embed=discord.Embed(description=preferences.language.get_string('restrict/disabled')))
 
         elif role_tag is None:
             # misused- show help
-            await message.channel.send(embed=discord.Embed(
+            self.reply(message, embed=discord.Embed(
                 description=preferences.language.get_string('restrict/help')))
 
         else:
             # enable permissions for role for selected commands
             role_id: int = int(role_tag.group(1))
+            added: typing.List[str] = []
 
             for command in filter(lambda x: len(x) <= 9, args):
                 c: typing.Optional[Command] = self.commands.get(command)
 
                 if c is not None and c.permission_level == PermissionLevels.MANAGED:
-                    q = preferences.command_restrictions \
-                        .filter(CommandRestriction.command == command) \
-                        .filter(CommandRestriction.role == role_id)
-
-                    if q.first() is None:
-                        new_restriction = CommandRestriction(guild_id=message.guild.id, command=command, role=role_id)
-
-                        session.add(new_restriction)
+                    if command not in restrictions.get(role_id, ()) and command not in added:
+                        added.append(command)
 
                 else:
-                    await message.channel.send(embed=discord.Embed(
+                    self.reply(message, embed=discord.Embed(
                         description=preferences.language.get_string('restrict/failure').format(command=command)))
 
-            await message.channel.send(embed=discord.Embed(
+            def _add():
+                session.add_all([CommandRestriction(guild_id=message.guild.id, command=command, role=role_id)
+                                 for command in added])
+                session.commit()
+
+            await self.db.run(_add)
+
+            for command in added:
+                self.db.restrictions.add(message.guild.id, role_id, command)
+
+            self.reply(message, embed=discord.Embed(
                 description=preferences.language.get_string('restrict/enabled')))
 
-        session.commit()
+        self.publish('restrictions', message.guild.id)
 
-    @staticmethod
-    async def todo(message, stripped, preferences):
+    async def todo(self, message, stripped, preferences):
         if 'todos' in message.content.split(' ')[0]:
-            location = preferences.guild
+            owner = {'guild_id': preferences.guild.id}
             name = message.guild.name
             command = 'todos'
         else:
-            location = preferences.user
+            owner = {'user_id': preferences.user.id}
             name = message.author.name
             command = 'todo'
 
-        todos = location.todo_list
-
         splits = stripped.split(' ')
 
         if len(splits) == 1 and splits[0] == '':
-            msg = ['\n{}: {}'.format(i, todo.value) for i, todo in enumerate(todos, start=1)]
-            if len(msg) == 0:
-                msg.append(preferences.language.get_string('todo/add').format(
-                    prefix=preferences.prefix, command=command))
+            title = '{} TODO'.format('Server' if command == 'todos' else 'Your', name)
 
-            s = ''
-            for item in msg:
-                if len(item) + len(s) < 2048:
-                    s += item
-                else:
-                    await message.channel.send(
-                        embed=discord.Embed(title='{} TODO'.format('Server' if command == 'todos' else 'Your', name),
-                                            description=s))
-                    s = ''
+            # fetched a batch at a time and sent a page at a time, so a long list is never held in memory at once
+            page = ''
+            after = 0
+
+            while True:
+                batch = await self.db.list_todos(TODO_BATCH, after, **owner)
+
+                pages = list(paginate(itertools.chain(
+                    [page], ('\n{}: {}'.format(position, value) for position, value in batch)), 2048))
+
+                # the last page may still have room, so it's carried on into the next batch
+                page = pages.pop() if len(pages) > 0 else ''
+
+                for full in pages:
+                    self.reply(message, embed=discord.Embed(title=title, description=full), priority=ReplyPriority.BULK)
+
+                if len(batch) > 0:
+                    after = batch[-1][0]
 
-            if len(s) > 0:
-                await message.channel.send(
-                    embed=discord.Embed(title='{} TODO'.format('Server' if command == 'todos' else 'Your', name),
-                                        description=s))
+                if len(batch) < TODO_BATCH:
+                    break
+
+            if after == 0:
+                page = preferences.language.get_string('todo/add').format(prefix=preferences.prefix, command=command)
+
+            if len(page) > 0:
+                self.reply(message, embed=discord.Embed(title=title, description=page), priority=ReplyPriority.BULK)
 
         elif len(splits) >= 2:
             if splits[0] == 'add':
                 a = ' '.join(splits[1:])
 
-                todo = Todo(value=a)
-                location.todo_list.append(todo)
-                await message.channel.send(preferences.language.get_string('todo/added').format(name=a))
+                await self.db.add_todo(a, **owner)
+                self.reply(message, preferences.language.get_string('todo/added').format(name=a))
 
             elif splits[0] == 'remove':
                 try:
-                    a = session.query(Todo).filter(Todo.id == todos[int(splits[1]) - 1].id).first()
-                    session.query(Todo).filter(Todo.id == todos[int(splits[1]) - 1].id).delete(
-                        synchronize_session='fetch')
-
-                    await message.channel.send(preferences.language.get_string('todo/removed').format(a.value))
+                    position = int(splits[1])
 
                 except ValueError:
-                    await message.channel.send(
-                        preferences.language.get_string('todo/error_value').format(
+                    self.reply(
+                        message, preferences.language.get_string('todo/error_value').format(
                             prefix=preferences.prefix, command=command))
 
-                except IndexError:
-                    await message.channel.send(preferences.language.get_string('todo/error_index'))
+                else:
+                    value = await self.db.remove_todo(position, **owner) if position > 0 else None
+
+                    if value is None:
+                        self.reply(message, preferences.language.get_string('todo/error_index'))
+
+                    else:
+                        self.reply(message, preferences.language.get_string('todo/removed').format(value))
 
             else:
-                await message.channel.send(
-                    preferences.language.get_string('todo/help').format(prefix=preferences.prefix, command=command))
+                self.reply(message, preferences.language.get_string('todo/help').format(
+                    prefix=preferences.prefix, command=command))
 
         else:
             if stripped == 'clear':
-                todos.clear()
-                await message.channel.send(preferences.language.get_string('todo/cleared'))
+                await self.db.clear_todos(**owner)
+                self.reply(message, preferences.language.get_string('todo/cleared'))
 
             else:
-                await message.channel.send(
-                    preferences.language.get_string('todo/help').format(prefix=preferences.prefix, command=command))
+                self.reply(message, preferences.language.get_string('todo/help').format(
+                    prefix=preferences.prefix, command=command))
 
-        session.commit()
+        await self.db.commit()
 
-    @staticmethod
-    async def delete(message, _stripped, preferences):
+    async def delete(self, message, _stripped, preferences):
         if message.guild is not None:
-            channels = preferences.guild.channels
-            reminders = itertools.chain(*[c.reminders for c in channels])
+            reminders = await self.db.list_guild_reminders(guild_id=preferences.guild.id)
 
         else:
-            reminders = preferences.user.channel.reminders
+            reminders = await self.db.list_guild_reminders(dm_channel_id=preferences.user.dm_channel)
 
-        await message.channel.send(preferences.language.get_string('del/listing'))
+        lines = (del_line(count, content, channel) for count, (_, content, channel) in enumerate(reminders, start=1))
 
-        enumerated_reminders = [x for x in enumerate(reminders, start=1)]
+        # queued together, so a short listing goes out as a single message along with the text around it
+        self.reply(message, preferences.language.get_string('del/listing'),
+                   priority=ReplyPriority.BULK, allowed_mentions=NoMention)
 
-        s = ''
-        for count, reminder in enumerated_reminders:
-            string = '''**{}**: '{}' *{}*\n'''.format(
-                count,
-                reminder.message_content(),
-                reminder.channel)
-
-            if len(s) + len(string) > 2000:
-                await message.channel.send(s, allowed_mentions=NoMention)
-                s = string
-            else:
-                s += string
+        for page in paginate(lines):
+            self.reply(message, page, priority=ReplyPriority.BULK, allowed_mentions=NoMention)
 
-        if s:
-            await message.channel.send(s, allowed_mentions=NoMention)
+        self.reply(message, preferences.language.get_string('del/listed'),
+                   priority=ReplyPriority.BULK, allowed_mentions=NoMention)
 
-        await message.channel.send(preferences.language.get_string('del/listed'))
-
-        num = await client.wait_for('message',
-                                    check=lambda m: m.author == message.author and m.channel == message.channel)
+        num = await self.wait_for('message',
+                                  check=lambda m: m.author == message.author and m.channel == message.channel)
 
         num_content = num.content.replace(',', ' ')
 
         nums = set([int(x) for x in re.findall(r'(\d+)(?:\s|$)', num_content)])
 
-        removal_ids: typing.Set[int] = set()
+        removal_ids: typing.Set[int] = {reminders[n - 1][0] for n in nums if 0 < n <= len(reminders)}
 
-        for count, reminder in enumerated_reminders:
-            if count in nums:
-                removal_ids.add(reminder.id)
-                nums.remove(count)
+        count = await self.db.delete_reminders(removal_ids)
 
-        session.query(Reminder).filter(Reminder.id.in_(removal_ids)).delete(synchronize_session='fetch')
-        session.commit()
+        for reminder_id in removal_ids:
+            self.scheduler.cancel(reminder_id)
 
-        await message.channel.send(preferences.language.get_string('del/count').format(len(removal_ids)))
+        self.reply(message, preferences.language.get_string('del/count').format(count))
 
-    @staticmethod
-    async def look(message, stripped, preferences):
+    async def look(self, message, stripped, preferences):
+
+        cursor_key = (message.author.id, message.channel.id)
+
+        if stripped.strip().lower() == 'next':
+            cursor: typing.Optional[ReminderCursor] = self.look_cursors.get(cursor_key)
+
+            if cursor is None:
+                self.reply(message, preferences.language.get_string('look/no_reminders'))
+
+            else:
+                await self.list_reminders(message, cursor, preferences)
+
+            return
 
         r = re.search(r'(\d+)', stripped)
 
@@ -898,67 +1209,107 @@ class BotClient(discord.AutoShardedClient):
         if r is not None:
             limit = int(r.groups()[0])
 
-        if 'enabled' in stripped:
-            show_disabled = False
-        else:
-            show_disabled = True
-
         if message.guild is None:
-            channel = preferences.user.channel
+            channel_id = preferences.user.dm_channel
             new = False
 
         else:
             discord_channel = message.channel_mentions[0] if len(message.channel_mentions) > 0 else message.channel
 
-            channel, new = Channel.get_or_create(discord_channel)
+            channel, new = await self.db.get_or_create_channel(discord_channel)
+            channel_id = channel.id
+
+        cursor = ReminderCursor(channel_id, enabled_only='enabled' in stripped, remaining=limit)
 
         if new:
-            await message.channel.send(preferences.language.get_string('look/no_reminders'))
+            self.reply(message, preferences.language.get_string('look/no_reminders'))
+
+        elif limit is not None:
+            count = await self.db.count_reminders(cursor, limit)
+
+            if count > 0:
+                self.reply(message, preferences.language.get_string('look/listing_limited').format(count),
+                           priority=ReplyPriority.BULK, allowed_mentions=NoMention)
+                await self.list_reminders(message, cursor, preferences)
+
+            else:
+                self.reply(message, preferences.language.get_string('look/no_reminders'))
 
         else:
-            reminder_query = channel.reminders.order_by(Reminder.time)
+            first = await self.db.list_reminders(cursor, LOOK_BATCH)
+
+            if len(first) > 0:
+                self.reply(message, preferences.language.get_string('look/listing'),
+                           priority=ReplyPriority.BULK, allowed_mentions=NoMention)
+                await self.list_reminders(message, cursor, preferences, first)
 
-            if not show_disabled:
-                reminder_query = reminder_query.filter(Reminder.enabled)
+            else:
+                self.reply(message, preferences.language.get_string('look/no_reminders'))
 
-            if limit is not None:
-                reminder_query = reminder_query.limit(limit)
+    async def list_reminders(self, message, cursor: ReminderCursor, preferences,
+                             batch: typing.Optional[typing.List[typing.Tuple[int, int, bool, str]]] = None):
+        # reminders are fetched a batch at a time and each page is sent as soon as it fills, so a channel with
+        # thousands of reminders is never held in memory at once. after LOOK_PAGES the cursor is kept for `look next`
+        cursor_key = (message.author.id, message.channel.id)
 
-            if reminder_query.count() > 0:
-                if limit is not None:
-                    await message.channel.send(preferences.language.get_string('look/listing_limited').format(
-                        reminder_query.count()))
+        timezone = pytz.timezone(preferences.timezone)
+        inter = preferences.language.get_string('look/inter')
+
+        page = ''
+        pages = 0
+
+        while True:
+            if batch is None:
+                count = LOOK_BATCH if cursor.remaining is None else min(LOOK_BATCH, cursor.remaining)
+
+                batch = await self.db.list_reminders(cursor, count) if count > 0 else []
+
+            if len(batch) == 0:
+                break
+
+            for reminder_id, time, enabled, content in batch:
+                string = look_line(content, inter, time, timezone, enabled)
+
+                if len(page) + len(string) > 2000 and len(page) > 0:
+                    self.reply(message, page, priority=ReplyPriority.BULK, allowed_mentions=NoMention)
+                    pages += 1
+
+                    if pages == LOOK_PAGES:
+                        # this reminder hasn't been shown, so the cursor still points just before it
+                        self.look_cursors.put(cursor_key, cursor)
+
+                        more = preferences.language.get_string(
+                            'look/more', 'Use `{}look next` to see more reminders').format(preferences.prefix)
+
+                        self.reply(message, more, priority=ReplyPriority.BULK, allowed_mentions=NoMention)
+
+                        return
+
+                    page = string
 
                 else:
-                    await message.channel.send(preferences.language.get_string('look/listing'))
-
-                s = ''
-                for reminder in reminder_query:
-                    string = '\'{}\' *{}* **{}** {}\n'.format(
-                        reminder.message_content(),
-                        preferences.language.get_string('look/inter'),
-                        datetime.fromtimestamp(reminder.time, pytz.timezone(preferences.timezone)).strftime(
-                            '%Y-%m-%d %H:%M:%S'),
-                        '' if reminder.enabled else '`disabled`')
-
-                    if len(s) + len(string) > 2000:
-                        await message.channel.send(s, allowed_mentions=NoMention)
-                        s = string
-                    else:
-                        s += string
+                    page += string
 
-                await message.channel.send(s, allowed_mentions=NoMention)
+                cursor.after = (time, reminder_id)
 
-            else:
-                await message.channel.send(preferences.language.get_string('look/no_reminders'))
+                if cursor.remaining is not None:
+                    cursor.remaining -= 1
 
-    @staticmethod
-    async def offset_reminders(message, stripped, preferences):
+            batch = None
 
-        if message.guild is None:
-            reminders = preferences.user.reminders
-        else:
-            reminders = itertools.chain(*[channel.reminders for channel in preferences.guild.channels])
+        if len(page) > 0:
+            self.reply(message, page, priority=ReplyPriority.BULK, allowed_mentions=NoMention)
+
+        self.look_cursors.discard(cursor_key)
+
+    async def offset_reminders(self, message, stripped, preferences):
+
+        # an optional channel mention limits the offset to that channel
+        target_channel: typing.Optional[int] = None
+
+        if message.guild is not None and len(message.channel_mentions) > 0:
+            target_channel = message.channel_mentions[0].id
+            stripped = re.sub(r'<#\d+>', '', stripped).strip()
 
         time_parser = TimeExtractor(stripped, preferences.timezone)
 
@@ -966,25 +1317,26 @@ class BotClient(discord.AutoShardedClient):
             time = time_parser.extract_displacement()
 
         except InvalidTime:
-            await message.channel.send(
-                embed=discord.Embed(description=preferences.language.get_string('offset/invalid_time')))
+            self.reply(
+                message, embed=discord.Embed(description=preferences.language.get_string('offset/invalid_time')))
 
         else:
             if time == 0:
-                await message.channel.send(embed=discord.Embed(
+                self.reply(message, embed=discord.Embed(
                     description=preferences.language.get_string('offset/help').format(prefix=preferences.prefix)))
 
             else:
-                for r in reminders:
-                    r.time += time
+                if message.guild is None:
+                    count = await self.db.offset_reminders(time, dm_channel_id=preferences.user.dm_channel)
+                else:
+                    count = await self.db.offset_reminders(time, guild_id=preferences.guild.id, channel=target_channel)
 
-                session.commit()
+                await self.scheduler.reload()
 
-                await message.channel.send(
-                    embed=discord.Embed(description=preferences.language.get_string('offset/success').format(time)))
+                self.reply(message, embed=discord.Embed(
+                    description=preferences.language.get_string('offset/success').format(time, count=count)))
 
-    @staticmethod
-    async def nudge_channel(message, stripped, preferences):
+    async def nudge_channel(self, message, stripped, preferences):
 
         time_parser = TimeExtractor(stripped, preferences.timezone)
 
@@ -992,24 +1344,38 @@ class BotClient(discord.AutoShardedClient):
             t = time_parser.extract_displacement()
 
         except InvalidTime:
-            await message.channel.send(embed=discord.Embed(
+            self.reply(message, embed=discord.Embed(
                 description=preferences.language.get_string('nudge/invalid_time')))
 
         else:
             if 2 ** 15 > t > -2 ** 15:
-                channel, _ = Channel.get_or_create(message.channel)
+                channel, _ = await self.db.get_or_create_channel(message.channel)
 
                 channel.nudge = t
 
-                session.commit()
+                await self.db.commit()
 
-                await message.channel.send(
-                    embed=discord.Embed(description=preferences.language.get_string('nudge/success').format(t)))
+                self.reply(message, embed=discord.Embed(
+                    description=preferences.language.get_string('nudge/success').format(t)))
 
             else:
-                await message.channel.send(
-                    embed=discord.Embed(description=preferences.language.get_string('nudge/invalid_time')))
+                self.reply(
+                    message, embed=discord.Embed(description=preferences.language.get_string('nudge/invalid_time')))
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] == ['migrate']:
+        create_tables()
+        print('Created any missing tables')
+
+        sys.exit()
+
+    config = Config(filename='config.ini')
 
+    if config.cluster_processes > 1:
+        Cluster(config.token, config.cluster_processes, config.shard_count,
+                max_messages=100, guild_subscriptions=False, fetch_offline_members=False).run()
 
-client = BotClient(max_messages=100, guild_subscriptions=False, fetch_offline_members=False)
-client.run(client.config.token)
+    else:
+        client = BotClient(max_messages=100, guild_subscriptions=False, fetch_offline_members=False)
+        client.run(client.config.token)
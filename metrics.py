@@ -0,0 +1,212 @@
+import bisect
+import contextvars
+import time
+import typing
+
+from aiohttp import web
+from sqlalchemy import event
+
+# the default prometheus client buckets, in seconds
+LATENCY_BUCKETS: typing.Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+class Histogram:
+    def __init__(self, buckets: typing.Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets: typing.Tuple[float, ...] = buckets
+        # one count per bucket, plus one for anything above the last. made cumulative when rendered
+        self.counts: typing.List[int] = [0] * (len(buckets) + 1)
+        self.sum: float = 0
+        self.count: int = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def render(self, name: str, labels: str) -> typing.List[str]:
+        lines = []
+        total = 0
+
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            lines.append('{}_bucket{{{},le="{}"}} {}'.format(name, labels, bound, total))
+
+        lines.append('{}_bucket{{{},le="+Inf"}} {}'.format(name, labels, self.count))
+        lines.append('{}_sum{{{}}} {}'.format(name, labels, self.sum))
+        lines.append('{}_count{{{}}} {}'.format(name, labels, self.count))
+
+        return lines
+
+
+class Usage:
+    # database work done on behalf of one command invocation
+    __slots__ = ('statements', 'db_time')
+
+    def __init__(self):
+        self.statements: int = 0
+        self.db_time: float = 0
+
+
+class CommandStats:
+    def __init__(self):
+        self.latency: Histogram = Histogram()
+        self.errors: int = 0
+        self.statements: int = 0
+        self.db_time: float = 0
+
+
+# the usage of the command running in the current task. Database.run copies the context onto its worker, so
+# statements executed there are counted against the command that asked for them
+current_usage: contextvars.ContextVar = contextvars.ContextVar('current_usage', default=None)
+
+
+class StartupTimer:
+    # how long each step from launch to the first on_ready took
+    def __init__(self, start: float):
+        self.phases: typing.List[typing.Tuple[str, float]] = []
+        self.finished: bool = False
+
+        self._last: float = start
+
+    def mark(self, phase: str):
+        # on_ready runs again after every reconnect, so nothing is recorded after the first time through
+        if self.finished:
+            return
+
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    def finish(self) -> str:
+        self.finished = True
+
+        return '{} (total {:.2f}s)'.format(
+            ', '.join('{} {:.2f}s'.format(phase, seconds) for phase, seconds in self.phases),
+            sum(seconds for _, seconds in self.phases))
+
+
+class Metrics:
+    # per command latency, errors and database load, plus totals for every statement the engine runs, served in the
+    # prometheus text format
+    def __init__(self, started: typing.Optional[float] = None):
+        self.commands: typing.Dict[str, CommandStats] = {}
+        self.startup: StartupTimer = StartupTimer(time.perf_counter() if started is None else started)
+
+        self.statements: int = 0
+        self.db_time: float = 0
+
+        self._runner: typing.Optional[web.AppRunner] = None
+
+    def install(self, engine):
+        event.listen(engine, 'before_cursor_execute', self._before_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_execute)
+
+    @staticmethod
+    def _before_execute(conn, _cursor, _statement, _parameters, _context, _executemany):
+        conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+    def _after_execute(self, conn, _cursor, _statement, _parameters, _context, _executemany):
+        elapsed = time.perf_counter() - conn.info['query_start'].pop()
+
+        self.statements += 1
+        self.db_time += elapsed
+
+        usage: typing.Optional[Usage] = current_usage.get()
+
+        if usage is not None:
+            usage.statements += 1
+            usage.db_time += elapsed
+
+    def track(self, command: str) -> 'Tracker':
+        return Tracker(self, command)
+
+    def record(self, command: str, elapsed: float, usage: Usage, failed: bool):
+        stats = self.commands.get(command)
+
+        if stats is None:
+            stats = self.commands[command] = CommandStats()
+
+        stats.latency.observe(elapsed)
+        stats.statements += usage.statements
+        stats.db_time += usage.db_time
+
+        if failed:
+            stats.errors += 1
+
+    def render(self) -> str:
+        lines = [
+            '# HELP reminder_command_seconds Time taken to run a command, including its commit',
+            '# TYPE reminder_command_seconds histogram',
+        ]
+
+        for name, stats in sorted(self.commands.items()):
+            lines.extend(stats.latency.render('reminder_command_seconds', 'command="{}"'.format(name)))
+
+        for metric, kind, description, value in (
+                ('reminder_command_errors_total', 'counter', 'Commands that raised',
+                 lambda s: s.errors),
+                ('reminder_command_sql_statements_total', 'counter', 'SQL statements executed by commands',
+                 lambda s: s.statements),
+                ('reminder_command_db_seconds_total', 'counter', 'Time commands spent waiting on SQL statements',
+                 lambda s: s.db_time)):
+
+            lines.append('# HELP {} {}'.format(metric, description))
+            lines.append('# TYPE {} {}'.format(metric, kind))
+
+            for name, stats in sorted(self.commands.items()):
+                lines.append('{}{{command="{}"}} {}'.format(metric, name, value(stats)))
+
+        lines.extend([
+            '# HELP reminder_sql_statements_total SQL statements executed, by commands and everything else',
+            '# TYPE reminder_sql_statements_total counter',
+            'reminder_sql_statements_total {}'.format(self.statements),
+            '# HELP reminder_db_seconds_total Time spent executing SQL statements',
+            '# TYPE reminder_db_seconds_total counter',
+            'reminder_db_seconds_total {}'.format(self.db_time),
+            '# HELP reminder_startup_seconds Time taken by each step of starting up',
+            '# TYPE reminder_startup_seconds gauge',
+        ])
+
+        for phase, seconds in self.startup.phases:
+            lines.append('reminder_startup_seconds{{phase="{}"}} {}'.format(phase, seconds))
+
+        return '\n'.join(lines) + '\n'
+
+    async def _serve_metrics(self, _request) -> web.Response:
+        return web.Response(body=self.render().encode(),
+                            headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'})
+
+    async def start(self, host: str, port: int):
+        # on_ready runs again after every reconnect, so only the first call starts the server
+        if self._runner is not None:
+            return
+
+        app = web.Application()
+        app.add_routes([web.get('/metrics', self._serve_metrics)])
+
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, host, port).start()
+
+
+class Tracker:
+    # times a command and collects the database work done while it runs
+    def __init__(self, metrics: Metrics, command: str):
+        self.metrics: Metrics = metrics
+        self.command: str = command
+        self.usage: Usage = Usage()
+
+        self._start: float = 0
+        self._token: typing.Optional[contextvars.Token] = None
+
+    def __enter__(self):
+        self._token = current_usage.set(self.usage)
+        self._start = time.perf_counter()
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.metrics.record(self.command, time.perf_counter() - self._start, self.usage, exc_type is not None)
+        current_usage.reset(self._token)
+
+        return False
@@ -1,9 +1,11 @@
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import Column, Integer, BigInteger, String, Text, Boolean, Table, ForeignKey
-from sqlalchemy import create_engine
+from sqlalchemy import Column, Integer, BigInteger, String, Text, Boolean, Table, ForeignKey, Index, UniqueConstraint
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker, scoped_session, relationship, backref
 from sqlalchemy.dialects.mysql import BIGINT, MEDIUMINT, SMALLINT, INTEGER as INT
 import configparser
+import contextvars
+import os
 import time
 import typing
 import secrets
@@ -12,10 +14,15 @@ from consts import ALL_CHARACTERS
 
 Base = declarative_base()
 
+UID_LIMIT: int = 256 - 256 % len(ALL_CHARACTERS)
+UID_TABLE: bytes = bytes(ord(ALL_CHARACTERS[n % len(ALL_CHARACTERS)]) if n < UID_LIMIT else 0 for n in range(256))
+UID_REJECT: bytes = bytes(range(UID_LIMIT, 256))
+
 guild_users = Table('guild_users',
                     Base.metadata,
                     Column('guild', INT(unsigned=True), ForeignKey('guilds.id')),
                     Column('user', INT(unsigned=True), ForeignKey('users.id')),
+                    UniqueConstraint('guild', 'user', name='guild_user'),
                     )
 
 
@@ -89,13 +96,6 @@ class Channel(Base):
         session.flush()
         return c, new
 
-    async def attach_webhook(self, channel):
-        if (self.webhook_token or self.webhook_id) is None:
-            hook = await channel.create_webhook(name='Reminders')
-
-            self.webhook_token = hook.token
-            self.webhook_id = hook.id
-
 
 class Role(Base):
     __tablename__ = 'roles'
@@ -163,6 +163,10 @@ class Message(Base):
 
 class Reminder(Base):
     __tablename__ = 'reminders'
+    __table_args__ = (
+        Index('reminders_due', 'enabled', 'time'),
+        Index('reminders_channel_due', 'channel_id', 'enabled', 'time'),
+    )
 
     id = Column(INT(unsigned=True), primary_key=True)
     uid = Column(String(64), default=lambda: Reminder.create_uid(), unique=True)
@@ -187,11 +191,17 @@ class Reminder(Base):
 
     @staticmethod
     def create_uid() -> str:
+        return Reminder.create_uids(1)[0]
+
+    @staticmethod
+    def create_uids(count: int) -> typing.List[str]:
+        # random bytes are mapped onto ALL_CHARACTERS in one pass, rather than a secrets.choice call per character.
+        # bytes past the last whole multiple of the alphabet are dropped so every character stays equally likely
         full: str = ''
-        while len(full) < 64:
-            full += secrets.choice(ALL_CHARACTERS)
+        while len(full) < 64 * count:
+            full += secrets.token_bytes(64 * count).translate(UID_TABLE, UID_REJECT).decode()
 
-        return full
+        return [full[n:n + 64] for n in range(0, 64 * count, 64)]
 
     def message_content(self):
         if len(self.message.content) > 0:
@@ -217,8 +227,18 @@ class Todo(Base):
     guild_id = Column(INT(unsigned=True), ForeignKey(Guild.id))
     guild = relationship(Guild, backref='todo_list')
 
+    # the number an item is listed under, from 1 and unique within a user's or guild's list, so it's found (and
+    # removed) without loading the items before it. removing an item leaves a gap rather than renumbering the rest, and
+    # a new item goes after the highest. there's no default, since a row at 0 would never be listed
+    position = Column(INT(unsigned=True), nullable=False)
+
     value = Column(String(2000), nullable=False)
 
+    __table_args__ = (
+        UniqueConstraint('user_id', 'position', name='todos_user_position'),
+        UniqueConstraint('guild_id', 'position', name='todos_guild_position'),
+    )
+
 
 class Timer(Base):
     __tablename__ = 'timers'
@@ -238,11 +258,75 @@ class Language(Base):
     name = Column(String(20), nullable=False, unique=True)
     code = Column(String(2), nullable=False, unique=True)
 
-    def get_string(self, string):
-        s = session.query(Strings).filter(Strings.c.name == string)
-        req = getattr(s.first(), 'value_{}'.format(self.code))
+    def get_string(self, string, default=None):
+        return strings_catalog.get(self.code, string, default)
+
+
+class StringCatalog:
+    # process-wide copy of the strings table. each language maps to a dict with the english value already
+    # filled in wherever the translation is missing, so a lookup is a single dict hit
+    def __init__(self):
+        self._tables: typing.Dict[str, typing.Dict[str, str]] = {}
+        self._languages: typing.Dict[str, Language] = {}
+        self._loaded: bool = False
+
+        self.misses: int = 0
+
+    def __len__(self):
+        return len(self._tables.get('EN', {}))
+
+    def reload(self):
+        # there's a value column per installed language, so the columns are read off the result rather than a table
+        # definition that would have to be built from the languages table first
+        result = session.execute(text('SELECT * FROM strings'))
+        codes = [key[len('value_'):] for key in result.keys() if key.startswith('value_')]
+
+        tables: typing.Dict[str, typing.Dict[str, str]] = {code: {} for code in codes}
+
+        for row in result:
+            english = row['value_EN'] if 'EN' in codes else None
+
+            for code in codes:
+                value = row['value_{}'.format(code)]
 
-        return req if req is not None else s.first().value_EN
+                if value is None:
+                    value = english
+
+                if value is not None:
+                    tables[code][row.name] = value
+
+        # swap in one assignment so lookups never see a half built catalog
+        self._tables = tables
+        self._languages = {language.code: language for language in session.query(Language)}
+        self._loaded = True
+
+    def codes(self) -> typing.List[str]:
+        if not self._loaded:
+            self.reload()
+
+        return list(self._languages)
+
+    def language(self, code: str) -> typing.Optional[Language]:
+        if not self._loaded:
+            self.reload()
+
+        return self._languages.get(code)
+
+    def get(self, code: str, name: str, default: typing.Optional[str] = None) -> str:
+        if not self._loaded:
+            self.reload()
+
+        table = self._tables.get(code) or self._tables.get('EN', {})
+
+        try:
+            return table[name]
+
+        except KeyError:
+            self.misses += 1
+            return name if default is None else default
+
+
+strings_catalog = StringCatalog()
 
 
 class CommandRestriction(Base):
@@ -257,41 +341,46 @@ class CommandRestriction(Base):
 
 Guild.command_restrictions = relationship(CommandRestriction, backref='guild', lazy='dynamic')
 
-config = configparser.ConfigParser()
-config.read('config.ini')
-user = config.get('MYSQL', 'USER')
-password: typing.Optional[str] = None
+# BOT_DATABASE_URL takes precedence over the MYSQL section of config.ini, so the models can be pointed at a scratch
+# database (such as a SQLite file for the benchmarks) without touching the config
+if 'BOT_DATABASE_URL' in os.environ:
+    engine = create_engine(os.environ['BOT_DATABASE_URL'])
 
-try:
-    password = config.get('MYSQL', 'PASSWD')
-except KeyError:
-    password = None
+else:
+    config = configparser.ConfigParser()
+    config.read('config.ini')
+    user = config.get('MYSQL', 'USER')
+    password: typing.Optional[str] = None
 
-host = config.get('MYSQL', 'HOST')
-database = config.get('MYSQL', 'DATABASE')
+    try:
+        password = config.get('MYSQL', 'PASSWD')
+    except KeyError:
+        password = None
 
-if password is not None:
-    engine = create_engine('mysql+pymysql://{user}:{passwd}@{host}/{db}?charset=utf8mb4'.format(
-        user=user, passwd=password, host=host, db=database))
+    host = config.get('MYSQL', 'HOST')
+    database = config.get('MYSQL', 'DATABASE')
+
+    if password is not None:
+        engine = create_engine('mysql+pymysql://{user}:{passwd}@{host}/{db}?charset=utf8mb4'.format(
+            user=user, passwd=password, host=host, db=database))
+
+    else:
+        engine = create_engine('mysql+pymysql://{user}@{host}/{db}?charset=utf8mb4'.format(
+            user=user, host=host, db=database))
 
-else:
-    engine = create_engine('mysql+pymysql://{user}@{host}/{db}?charset=utf8mb4'.format(
-        user=user, host=host, db=database))
 
-Base.metadata.create_all(bind=engine)
+def create_tables():
+    # only run by `main.py migrate`, not on import, so a restart doesn't wait on checking every table. the strings
+    # table isn't a model, since its columns depend on the languages installed, so it comes from the languages files
+    Base.metadata.create_all(bind=engine)
 
-session_factory = sessionmaker(bind=engine)
-Session = scoped_session(session_factory)
-session = Session()
 
-languages = session.query(Language.code).all()
+# objects are read on the event loop after the database executor commits, so they must not expire and lazily
+# refresh themselves from there
+session_factory = sessionmaker(bind=engine, expire_on_commit=False)
 
-Strings = Table('strings', Base.metadata,
-                Column('id', Integer, primary_key=True),
-                Column('name', Text),
-                *(
-                    Column('value_{}'.format(lang[0]), Text) for lang in languages
-                )
-                )
+# which session `session` stands for. Database.scope gives each command (and each background job) its own, and
+# Database.run copies the context onto its workers, so statements run there use the session of the task that asked
+session_scope: contextvars.ContextVar = contextvars.ContextVar('session_scope', default=None)
 
-ENGLISH_STRINGS: typing.Optional[Language] = session.query(Language).filter(Language.code == 'EN').first()
+session = scoped_session(session_factory, scopefunc=session_scope.get)
@@ -0,0 +1,109 @@
+import asyncio
+import concurrent.futures
+import typing
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+# set in each worker process by _initialise
+_languages: typing.Optional[typing.List[str]] = None
+
+
+def _initialise(codes: typing.List[str]):
+    global _languages
+
+    import dateparser
+    from dateparser.languages.loader import default_loader
+
+    available = default_loader.get_locale_map()
+
+    _languages = [code.lower() for code in codes if code.lower() in available] or None
+
+    # the first parse loads the locale data, so get that out of the way before any real work arrives
+    dateparser.parse('in 1 hour', languages=_languages)
+
+
+def _parse(string: str, settings: typing.Optional[dict]) -> typing.Optional[datetime]:
+    import dateparser
+
+    return dateparser.parse(string, languages=_languages, settings=settings)
+
+
+class NaturalParser:
+    # dateparser is CPU bound, so natural times are parsed in a pool of worker processes rather than threads that
+    # would hold the GIL against the event loop. workers only consider the bot's languages instead of every locale
+    def __init__(self, workers: int = 2, queue_size: int = 32, timeout: float = 5):
+        self.workers: int = workers
+        self.queue_size: int = queue_size
+        self.timeout: float = timeout
+
+        self.pending: int = 0
+        self.rejected: int = 0
+        self.timed_out: int = 0
+        self.restarts: int = 0
+
+        self.languages: typing.List[str] = []
+        self.executor: typing.Optional[concurrent.futures.ProcessPoolExecutor] = None
+
+    def start(self, languages: typing.List[str]):
+        # the languages aren't known until the strings are loaded, so the workers are started from on_ready. that runs
+        # again after every reconnect, so only the first call does anything
+        if self.executor is not None:
+            return
+
+        self.languages = languages
+        self.executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.workers, initializer=_initialise, initargs=(languages,))
+
+        # the first submission starts the workers, so their warm-up isn't paid by the first natural commands
+        self.executor.submit(int)
+
+    async def parse(self, string: str, settings: typing.Optional[dict] = None) -> typing.Optional[datetime]:
+        # turn work away rather than let a burst build an unbounded backlog; callers treat it like a failed parse
+        if self.executor is None or self.pending >= self.queue_size:
+            self.rejected += 1
+            return None
+
+        executor = self.executor
+
+        try:
+            future = asyncio.get_event_loop().run_in_executor(executor, _parse, string, settings)
+
+            # a worker can't be stopped partway through a string, so the slot is held until it's done rather than until
+            # the caller gives up on it. otherwise strings that time out would keep piling onto busy workers
+            self.pending += 1
+            future.add_done_callback(self._release)
+
+            return await asyncio.wait_for(asyncio.shield(future), timeout=self.timeout)
+
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            return None
+
+        except BrokenProcessPool:
+            self._restart(executor)
+            return None
+
+    def _release(self, future: asyncio.Future):
+        self.pending -= 1
+
+        # the caller may have stopped waiting, so the exception is retrieved here
+        if not future.cancelled():
+            future.exception()
+
+    def _restart(self, executor: concurrent.futures.ProcessPoolExecutor):
+        # a worker that dies (killed for memory, say) breaks the whole pool, and every parse waiting on it fails. only
+        # the first of them replaces it
+        if self.executor is not executor:
+            return
+
+        print('Natural parser workers died. Restarting them')
+
+        self.restarts += 1
+        executor.shutdown(wait=False)
+
+        self.executor = None
+        self.start(self.languages)
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
@@ -1,7 +1,7 @@
 import discord
 
 from enums import PermissionLevels, CreateReminderResponse
-from models import Guild, User, Language, session, ENGLISH_STRINGS, CommandRestriction
+from models import Guild, User, Language, session, CommandRestriction, strings_catalog
 import typing
 
 
@@ -15,7 +15,7 @@ class Command:
         self.permission_level = permission_level
         self.blacklists = blacklists
 
-    def check_permissions(self, member: discord.Member, guild_data: Guild):
+    def check_permissions(self, member: discord.Member, restrictions: typing.Dict[int, typing.Set[str]]):
         if self.permission_level == PermissionLevels.UNRESTRICTED:
             return True
 
@@ -24,11 +24,10 @@ class Command:
                 return True
 
             else:
-                restrict = guild_data.command_restrictions \
-                    .filter(CommandRestriction.command == self.name) \
-                    .filter(CommandRestriction.role.in_([x.id for x in member.roles]))
+                # restrictions maps role id -> commands that role can use
+                roles = restrictions.keys() & {x.id for x in member.roles}
 
-                return restrict.count() != 0
+                return any(self.name in restrictions[role] for role in roles)
 
         elif self.permission_level == PermissionLevels.RESTRICTED:
             return member.guild_permissions.manage_guild
@@ -43,8 +42,8 @@ class Preferences:
         timezone_code: str = user.timezone or ('UTC' if guild is None else guild.timezone)
         guild_timezone_code = None if guild is None else guild.timezone
 
-        self._language: typing.Optional[Language] = session.query(Language).filter(
-            Language.code == language_code).first() or ENGLISH_STRINGS
+        self._language: typing.Optional[Language] = strings_catalog.language(language_code) or \
+            strings_catalog.language('EN')
         self._timezone: str = timezone_code
         self._guild_timezone: str = guild_timezone_code
         self._prefix: str = '$'
@@ -0,0 +1,133 @@
+import asyncio
+import typing
+from time import time as unix_time
+
+import aiohttp
+
+API_URL = 'https://discordapp.com/api/v6'
+
+
+class PatreonMembership:
+    # answers "does this user hold the patreon role" without a REST call per command. a background task pulls the
+    # whole patreon server roster, and individual lookups are only made for users seen between roster refreshes.
+    # answers are cached (positive and negative), and when the API is slow or failing the last known value is used
+    def __init__(self, server: int, role: int, token: str, *,
+                 ttl: float = 900, negative_ttl: float = 300, timeout: float = 2, refresh_interval: float = 900):
+
+        self.server: int = server
+        self.role: int = role
+        self.ttl: float = ttl
+        self.negative_ttl: float = negative_ttl
+        self.timeout: float = timeout
+        self.refresh_interval: float = refresh_interval
+
+        self.session: typing.Optional[aiohttp.ClientSession] = None
+
+        self.hits: int = 0
+        self.lookups: int = 0
+
+        self._headers: dict = {
+            'authorization': 'Bot {}'.format(token),
+            'content-type': 'application/json'
+        }
+
+        # member id -> (is patron, time checked)
+        self._members: typing.Dict[int, typing.Tuple[bool, float]] = {}
+
+        self._roster: typing.Set[int] = set()
+        self._roster_time: float = 0
+
+        self._task: typing.Optional[asyncio.Task] = None
+
+    def start(self, session: aiohttp.ClientSession):
+        self.session = session
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._refresh_forever())
+
+    async def is_patron(self, member_id: int) -> bool:
+        now = unix_time()
+        cached = self._members.get(member_id)
+
+        if cached is not None and now - cached[1] < (self.ttl if cached[0] else self.negative_ttl):
+            self.hits += 1
+            return cached[0]
+
+        elif now - self._roster_time < self.refresh_interval * 2:
+            # the roster covers everyone in the server, so anyone missing from it isn't a patron
+            self.hits += 1
+            return member_id in self._roster
+
+        self.lookups += 1
+
+        try:
+            patron = await asyncio.wait_for(self._fetch_member(member_id), timeout=self.timeout)
+
+        except (asyncio.TimeoutError, aiohttp.ClientError):
+            patron = None
+
+        if patron is None:
+            # API slow or unavailable, so fall back to whatever was last known
+            if cached is not None:
+                return cached[0]
+
+            return member_id in self._roster
+
+        self._members[member_id] = (patron, now)
+
+        return patron
+
+    async def _fetch_member(self, member_id: int) -> typing.Optional[bool]:
+        url = '{}/guilds/{}/members/{}'.format(API_URL, self.server, member_id)
+
+        async with self.session.get(url, headers=self._headers) as resp:
+            if resp.status == 200:
+                member = await resp.json()
+
+                return self.role in [int(x) for x in member['roles']]
+
+            elif resp.status == 404:
+                # not in the patreon server
+                return False
+
+            else:
+                return None
+
+    async def refresh(self):
+        roster: typing.Set[int] = set()
+        after = 0
+
+        while True:
+            url = '{}/guilds/{}/members?limit=1000&after={}'.format(API_URL, self.server, after)
+
+            async with self.session.get(url, headers=self._headers) as resp:
+                if resp.status != 200:
+                    print('Patreon roster refresh failed with {}'.format(resp.status))
+                    return
+
+                members = await resp.json()
+
+            for member in members:
+                if self.role in [int(x) for x in member['roles']]:
+                    roster.add(int(member['user']['id']))
+
+            if len(members) < 1000:
+                break
+
+            after = members[-1]['user']['id']
+
+        self._roster = roster
+        self._roster_time = unix_time()
+
+        # individual answers are superseded by the roster
+        self._members.clear()
+
+    async def _refresh_forever(self):
+        while True:
+            try:
+                await self.refresh()
+
+            except (asyncio.TimeoutError, aiohttp.ClientError) as e:
+                print('Patreon roster refresh failed: {}'.format(e))
+
+            await asyncio.sleep(self.refresh_interval)
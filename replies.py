@@ -0,0 +1,182 @@
+import asyncio
+import collections
+import heapq
+import itertools
+import time
+import typing
+
+import discord
+
+from enums import ReplyPriority
+
+# discord lets a bot send 5 messages to a channel every 5 seconds
+CHANNEL_RATE = 5
+CHANNEL_PER = 5.0
+
+MESSAGE_LENGTH = 2000
+
+
+class RateBucket:
+    # the times of the last `rate` sends. the next may go once the oldest of them is `per` seconds old, so a burst waits
+    # here instead of running into discord's limit and being held back by a 429
+    def __init__(self, rate: int = CHANNEL_RATE, per: float = CHANNEL_PER):
+        self.rate: int = rate
+        self.per: float = per
+
+        self._sent: collections.deque = collections.deque(maxlen=rate)
+
+    def delay(self) -> float:
+        if len(self._sent) < self.rate:
+            return 0
+
+        return max(0.0, self._sent[0] + self.per - time.monotonic())
+
+    def spend(self):
+        self._sent.append(time.monotonic())
+
+
+class Reply:
+    __slots__ = ('content', 'embed', 'allowed_mentions', 'mergeable', 'futures')
+
+    def __init__(self, content: typing.Optional[str], embed: typing.Optional[discord.Embed], allowed_mentions,
+                 mergeable: bool, future: asyncio.Future):
+        self.content: typing.Optional[str] = content
+        self.embed: typing.Optional[discord.Embed] = embed
+        self.allowed_mentions = allowed_mentions
+        self.mergeable: bool = mergeable
+        # one for each reply merged into this one, all given the message that's sent
+        self.futures: typing.List[asyncio.Future] = [future]
+
+    def merge(self, other: 'Reply') -> bool:
+        # text is joined to text while it fits in one message, and a single embed may follow it. nothing goes after an
+        # embed, since it would show above it
+        if not self.mergeable or not other.mergeable:
+            return False
+
+        if self.embed is not None or other.content is None:
+            if other.embed is not None and other.content is None and self.embed is None and self.content:
+                self.embed = other.embed
+                self.futures.extend(other.futures)
+
+                return True
+
+            return False
+
+        if other.allowed_mentions is not self.allowed_mentions or \
+                len(self.content) + len(other.content) + 1 > MESSAGE_LENGTH:
+            return False
+
+        self.content = '{}\n{}'.format(self.content, other.content)
+        self.embed = other.embed
+        self.futures.extend(other.futures)
+
+        return True
+
+
+class ChannelOutbox:
+    # the replies waiting to go to one channel, sent one at a time in priority order and then the order they were
+    # queued. whatever has queued up behind a reply while it waits is merged into it where it fits
+    def __init__(self, replies: 'Replies', channel):
+        self.replies: 'Replies' = replies
+        self.channel = channel
+        self.bucket: RateBucket = RateBucket(replies.rate, replies.per)
+
+        self._queue: typing.List[typing.Tuple[int, int, Reply]] = []
+        self._order = itertools.count()
+        self._wake: asyncio.Event = asyncio.Event()
+
+        self._task: asyncio.Task = asyncio.ensure_future(self._drain())
+
+    def __len__(self):
+        return len(self._queue)
+
+    def put(self, reply: Reply, priority: ReplyPriority):
+        heapq.heappush(self._queue, (priority, next(self._order), reply))
+        self._wake.set()
+
+    async def _drain(self):
+        while True:
+            if len(self._queue) == 0:
+                # kept around while the bucket still remembers recent sends, then forgotten
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.bucket.per)
+
+                except asyncio.TimeoutError:
+                    if len(self._queue) == 0:
+                        del self.replies.outboxes[self.channel.id]
+                        return
+
+                self._wake.clear()
+                continue
+
+            delay = self.bucket.delay()
+
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            priority, _, reply = heapq.heappop(self._queue)
+
+            while len(self._queue) > 0 and self._queue[0][0] == priority and reply.merge(self._queue[0][2]):
+                heapq.heappop(self._queue)
+                self.replies.merged += 1
+
+            self.bucket.spend()
+            await self._send(reply)
+
+    async def _send(self, reply: Reply):
+        try:
+            message = await self.channel.send(reply.content, embed=reply.embed,
+                                              allowed_mentions=reply.allowed_mentions)
+
+        except Exception as e:
+            print('Failed to reply in {}: {}'.format(self.channel.id, e))
+
+            for future in reply.futures:
+                if not future.done():
+                    future.set_exception(e)
+
+        else:
+            self.replies.sent += 1
+
+            for future in reply.futures:
+                if not future.done():
+                    future.set_result(message)
+
+
+def _retrieve(future: asyncio.Future):
+    # the failure has already been printed, and most callers never look at the future
+    if not future.cancelled():
+        future.exception()
+
+
+class Replies:
+    # the way commands answer. a reply is queued for its channel and sent in the background, so a command doesn't wait
+    # on discord between each of its messages, and replies that queue up together go as fewer messages
+    def __init__(self, rate: int = CHANNEL_RATE, per: float = CHANNEL_PER):
+        self.rate: int = rate
+        self.per: float = per
+
+        self.sent: int = 0
+        self.merged: int = 0
+
+        self.outboxes: typing.Dict[int, ChannelOutbox] = {}
+
+    def send(self, channel, content: typing.Optional[str] = None, *, embed: typing.Optional[discord.Embed] = None,
+             allowed_mentions=None, priority: ReplyPriority = ReplyPriority.INTERACTIVE,
+             merge: bool = True) -> asyncio.Future:
+        # resolves to the message the reply went out in, which is shared with any replies merged into it. a reply whose
+        # message is going to be edited is sent with merge=False, so the edit can't overwrite anything else
+        future = asyncio.get_event_loop().create_future()
+        future.add_done_callback(_retrieve)
+
+        outbox = self.outboxes.get(channel.id)
+
+        if outbox is None:
+            outbox = self.outboxes[channel.id] = ChannelOutbox(self, channel)
+
+        outbox.put(Reply(content, embed, allowed_mentions, merge, future), priority)
+
+        return future
+
+    def __len__(self):
+        return sum(len(outbox) for outbox in self.outboxes.values())
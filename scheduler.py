@@ -0,0 +1,196 @@
+import asyncio
+import heapq
+import time as clock_time
+import typing
+
+# a delivery that raises is tried again after RETRY_DELAY seconds, doubling each time, up to RETRY_LIMIT attempts
+RETRY_DELAY = 15
+RETRY_LIMIT = 5
+# a refill that fails is tried again after RETRY_DELAY seconds, doubling each time, up to this
+REFILL_BACKOFF_LIMIT = 300
+
+
+class ReminderScheduler:
+    # in-process delivery of reminders. only reminders due within `window` seconds are held, in a heap ordered by
+    # time; every half window the database is scanned again from the last scan up to the new horizon, so reminders
+    # written by other processes are picked up too, and anything created or changed here is pushed in directly. the
+    # clock is injectable so delivery latency can be measured offline
+    def __init__(self,
+                 load: typing.Callable[[int, int], typing.Awaitable[typing.Iterable[typing.Tuple[int, int]]]],
+                 deliver: typing.Callable[[int], typing.Awaitable[None]],
+                 *, window: int = 300, clock: typing.Callable[[], float] = clock_time.time):
+
+        self.window: int = window
+        self.delivered: int = 0
+
+        self._load = load
+        self._deliver = deliver
+        self._clock = clock
+
+        # reminder id -> time it is due. heap entries that disagree with this are stale and skipped when popped
+        self._due: typing.Dict[int, int] = {}
+        self._heap: typing.List[typing.Tuple[int, int]] = []
+        # popped but not yet delivered, so a reload doesn't queue them a second time
+        self._firing: typing.Set[int] = set()
+        # reminder id -> failed deliveries so far
+        self._attempts: typing.Dict[int, int] = {}
+        self._horizon: float = 0
+        self._scanned: float = 0
+
+        self._wake: typing.Optional[asyncio.Event] = None
+        self._task: typing.Optional[asyncio.Task] = None
+
+    def __len__(self):
+        return len(self._due)
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self):
+        if not self.running:
+            self._wake = asyncio.Event()
+            self._task = asyncio.ensure_future(self._run())
+            self._task.add_done_callback(self._stopped)
+
+    def _stopped(self, task: asyncio.Task):
+        # with the scheduler on the postman is off, so a loop that dies would stop reminders going out at all
+        if task.cancelled():
+            return
+
+        print('Reminder scheduler stopped: {!r}. Restarting in {}s'.format(task.exception(), RETRY_DELAY))
+        asyncio.get_event_loop().call_later(RETRY_DELAY, self.start)
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    def push(self, reminder_id: int, time: int):
+        # reminders beyond the horizon are left for the next refill to pick up
+        if time <= self._horizon:
+            self._due[reminder_id] = time
+            heapq.heappush(self._heap, (time, reminder_id))
+
+            if self._wake is not None:
+                self._wake.set()
+
+        else:
+            self._due.pop(reminder_id, None)
+
+    def cancel(self, reminder_id: int):
+        self._due.pop(reminder_id, None)
+
+    async def reload(self):
+        if not self.running:
+            return
+
+        # move the horizon before loading so anything pushed while the query runs is kept rather than dropped
+        self._horizon = self._clock() + self.window
+
+        rows = await self._load(0, int(self._horizon))
+
+        self._due = {reminder_id: time for reminder_id, time in rows if reminder_id not in self._firing}
+        self._heap = [(time, reminder_id) for reminder_id, time in self._due.items()]
+        heapq.heapify(self._heap)
+
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _refill(self, start: int):
+        # the whole window is read again rather than just the slice that has come into it, since other processes (other
+        # workers, the postman, the dashboard) write reminders due inside it. anything due since the last scan is
+        # included, so a reminder written for a moment that passed in between isn't missed. the scan only counts once
+        # the load has worked, so after a failure the next attempt starts from the same place
+        now = self._clock()
+        self._horizon = now + self.window
+
+        await self._refill_from(start)
+
+        self._scanned = now
+
+    async def _refill_from(self, start: int):
+        for reminder_id, time in await self._load(start, int(self._horizon)):
+            # already queued for that time, being delivered now, or waiting to be retried
+            if self._due.get(reminder_id) != time and reminder_id not in self._firing and \
+                    reminder_id not in self._attempts:
+                self._due[reminder_id] = time
+                heapq.heappush(self._heap, (time, reminder_id))
+
+    async def _run(self):
+        # the first load takes in everything overdue
+        loaded = False
+        failures = 0
+        next_refill = self._clock()
+
+        while True:
+            now = self._clock()
+
+            if now >= next_refill:
+                try:
+                    await self._refill(int(self._scanned) if loaded else 0)
+
+                except Exception as e:
+                    failures += 1
+                    delay = min(REFILL_BACKOFF_LIMIT, RETRY_DELAY * 2 ** (failures - 1))
+
+                    print('Failed to load reminders: {}. Retrying in {}s'.format(e, delay))
+                    next_refill = now + delay
+
+                else:
+                    loaded = True
+                    failures = 0
+                    next_refill = now + self.window / 2
+
+            while self._heap and self._heap[0][0] <= now:
+                time, reminder_id = heapq.heappop(self._heap)
+
+                if self._due.get(reminder_id) == time:
+                    del self._due[reminder_id]
+                    self._firing.add(reminder_id)
+
+                    asyncio.ensure_future(self._fire(reminder_id))
+
+            wait = next_refill - now
+
+            if self._heap:
+                wait = min(wait, self._heap[0][0] - now)
+
+            self._wake.clear()
+
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=max(wait, 0))
+
+            except asyncio.TimeoutError:
+                pass
+
+    async def _fire(self, reminder_id: int):
+        try:
+            await self._deliver(reminder_id)
+
+        except Exception as e:
+            attempts = self._attempts.get(reminder_id, 0) + 1
+            self._firing.discard(reminder_id)
+
+            if attempts < RETRY_LIMIT:
+                self._attempts[reminder_id] = attempts
+
+                delay = RETRY_DELAY * 2 ** (attempts - 1)
+                retry = int(self._clock()) + delay
+
+                print('Failed to deliver reminder {}: {}. Retrying in {}s'.format(reminder_id, e, delay))
+
+                # held whether or not it's inside the horizon, since a refill wouldn't find it again
+                self._due[reminder_id] = retry
+                heapq.heappush(self._heap, (retry, reminder_id))
+
+                if self._wake is not None:
+                    self._wake.set()
+
+            else:
+                self._attempts.pop(reminder_id, None)
+                print('Failed to deliver reminder {} after {} attempts: {}'.format(reminder_id, attempts, e))
+
+        else:
+            self.delivered += 1
+            self._attempts.pop(reminder_id, None)
+            self._firing.discard(reminder_id)
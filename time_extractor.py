@@ -1,7 +1,12 @@
-import pytz
-from datetime import datetime
+import bisect
+import functools
+import re
+import typing
+from datetime import datetime, timezone as fixed_timezone
 from time import time as unix_time
 
+import pytz
+
 from enums import TimeExtractionTypes
 
 
@@ -9,6 +14,53 @@ class InvalidTime(Exception):
     pass
 
 
+# one clump of an explicit time: a date (day/month[/year]), a time (hour:minute[:second]) or a lone day
+EXPLICIT_CLUMP = re.compile(
+    r'(?:(?P<day>\d+)/(?P<month>\d+)(?:/(?P<year>\d+))?|(?P<hour>\d+):(?P<minute>\d+)(?::(?P<second>\d+))?|(?P<date>\d+))'
+)
+# a displacement: any number of digits-and-unit steps, then optional trailing digits counted as seconds
+DISPLACEMENT = re.compile(r'(?P<steps>(?:\d*[smhd])*)(?P<seconds>\d*)')
+DISPLACEMENT_STEP = re.compile(r'(\d*)([smhd])')
+
+UNIT_SECONDS: typing.Dict[str, int] = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+class _ZoneCache:
+    # timezone name -> (fixed offset tzinfo, span of time over which that offset holds). the offset only changes at
+    # a DST transition, so it is resolved through pytz once per transition rather than on every parse
+    def __init__(self):
+        self._zones: typing.Dict[str, typing.Tuple[fixed_timezone, float, float]] = {}
+
+    def get(self, name: str, now: float) -> fixed_timezone:
+        cached = self._zones.get(name)
+
+        if cached is not None and cached[1] <= now < cached[2]:
+            return cached[0]
+
+        zone = pytz.timezone(name)
+        offset = fixed_timezone(datetime.fromtimestamp(now, zone).utcoffset())
+
+        transitions = getattr(zone, '_utc_transition_times', None)
+        if transitions:
+            utc_now = datetime.fromtimestamp(now, fixed_timezone.utc).replace(tzinfo=None)
+            index = bisect.bisect_right(transitions, utc_now)
+
+            valid_from = float('-inf') if index == 0 else \
+                transitions[index - 1].replace(tzinfo=fixed_timezone.utc).timestamp()
+            valid_until = float('inf') if index == len(transitions) else \
+                transitions[index].replace(tzinfo=fixed_timezone.utc).timestamp()
+
+        else:
+            valid_from, valid_until = float('-inf'), float('inf')
+
+        self._zones[name] = (offset, valid_from, valid_until)
+
+        return offset
+
+
+zones = _ZoneCache()
+
+
 class TimeExtractor:
     def __init__(self, string, timezone=None):
         self.timezone: str = timezone
@@ -30,84 +82,126 @@ class TimeExtractor:
         else:
             self.process_type = TimeExtractionTypes.DISPLACEMENT
 
-    def extract_exact(self) -> int:  # produce a timestamp
-        return int(self._process_spaceless())
+    def extract_exact(self, now: typing.Optional[float] = None) -> int:  # produce a timestamp
+        if now is None:
+            now = unix_time()
+
+        return int(self._process_spaceless(now))
+
+    def extract_displacement(self, now: typing.Optional[float] = None) -> int:  # produce a relative time
+        if now is None:
+            now = unix_time()
 
-    def extract_displacement(self) -> int:  # produce a relative time
-        return int(round(self._process_spaceless() - unix_time()))
+        if self.process_type == TimeExtractionTypes.DISPLACEMENT:
+            return self._process_displacement()
+
+        else:
+            return int(round(self._process_spaceless(now) - now))
 
-    def _process_spaceless(self) -> float:
+    def _process_spaceless(self, now: float) -> float:
         if self.process_type == TimeExtractionTypes.EXPLICIT:
             try:
-                d = self._process_explicit()
+                d = self._process_explicit(now)
             except ValueError:
                 raise InvalidTime()
             return d
 
         else:
             d = self._process_displacement()
-            return unix_time() + d
+            return now + d
 
-    def _process_explicit(self) -> float:  # processing times that dictate a specific time
-        date = datetime.now(pytz.timezone(self.timezone))
+    def _process_explicit(self, now: float) -> float:  # processing times that dictate a specific time
+        date = datetime.fromtimestamp(now, zones.get(self.timezone, now))
 
         for clump in self.time_string.split('-'):
-            if '/' in clump:
-                a = clump.split('/')
-                if len(a) == 2:
-                    date = date.replace(month=int(a[1]), day=int(a[0]))
-                elif len(a) == 3:
-                    date = date.replace(year=int(a[2]), month=int(a[1]), day=int(a[0]))
-
-            elif ':' in clump:
-                a = clump.split(':')
-                if len(a) == 2:
-                    date = date.replace(hour=int(a[0]), minute=int(a[1]))
-                elif len(a) == 3:
-                    date = date.replace(hour=int(a[0]), minute=int(a[1]), second=int(a[2]))
+            match = EXPLICIT_CLUMP.fullmatch(clump)
+
+            if match is None:
+                # int() is more lenient than the pattern (signs, whitespace, underscores), so anything unusual is
+                # handled exactly as it always has been
+                date = self._process_clump(clump, date)
+
+            elif match.group('day') is not None:
+                if match.group('year') is None:
+                    date = date.replace(month=int(match.group('month')), day=int(match.group('day')))
+                else:
+                    date = date.replace(year=int(match.group('year')), month=int(match.group('month')),
+                                        day=int(match.group('day')))
+
+            elif match.group('hour') is not None:
+                if match.group('second') is None:
+                    date = date.replace(hour=int(match.group('hour')), minute=int(match.group('minute')))
                 else:
-                    raise InvalidTime()
+                    date = date.replace(hour=int(match.group('hour')), minute=int(match.group('minute')),
+                                        second=int(match.group('second')))
 
             else:
-                date = date.replace(day=int(clump))
+                date = date.replace(day=int(match.group('date')))
 
         return date.timestamp()
 
+    @staticmethod
+    def _process_clump(clump: str, date: datetime) -> datetime:
+        if '/' in clump:
+            a = clump.split('/')
+            if len(a) == 2:
+                date = date.replace(month=int(a[1]), day=int(a[0]))
+            elif len(a) == 3:
+                date = date.replace(year=int(a[2]), month=int(a[1]), day=int(a[0]))
+
+        elif ':' in clump:
+            a = clump.split(':')
+            if len(a) == 2:
+                date = date.replace(hour=int(a[0]), minute=int(a[1]))
+            elif len(a) == 3:
+                date = date.replace(hour=int(a[0]), minute=int(a[1]), second=int(a[2]))
+            else:
+                raise InvalidTime()
+
+        else:
+            date = date.replace(day=int(clump))
+
+        return date
+
     def _process_displacement(self) -> int:  # processing times that dictate a time relative to now
-        current_buffer = '0'
-        seconds = 0
-        minutes = 0
-        hours = 0
-        days = 0
+        full = _parse_displacement(self.time_string)
+
+        if self.inverted:
+            full = -full
 
-        for char in self.time_string:
+        return full
 
-            if char == 's':
-                seconds = int(current_buffer)
-                current_buffer = '0'
 
-            elif char == 'm':
-                minutes = int(current_buffer)
-                current_buffer = '0'
+@functools.lru_cache(maxsize=1024)
+def _parse_displacement(string: str) -> int:
+    # the same handful of strings ('1h', '30m', '1d') make up most displacements, so results are memoised
+    match = DISPLACEMENT.fullmatch(string)
 
-            elif char == 'h':
-                hours = int(current_buffer)
-                current_buffer = '0'
+    if match is None:
+        raise InvalidTime()
 
-            elif char == 'd':
-                days = int(current_buffer)
-                current_buffer = '0'
+    # a repeated unit replaces the earlier value rather than adding to it
+    values = {unit: int(value or 0) for value, unit in DISPLACEMENT_STEP.findall(match.group('steps'))}
 
-            else:
-                try:
-                    int(char)
-                    current_buffer += char
-                except ValueError:
-                    raise InvalidTime()
+    return int(match.group('seconds') or 0) + sum(UNIT_SECONDS[unit] * value for unit, value in values.items())
 
-        full = seconds + (minutes * 60) + (hours * 3600) + (days * 86400) + int(current_buffer)
 
-        if self.inverted:
-            full = -full
+def extract_many(strings: typing.Iterable[str], timezone: typing.Optional[str] = None, *,
+                 displacement: bool = False) -> typing.List[typing.Optional[int]]:
+    # parse a batch against a single reading of the clock. invalid strings give None
+    now = unix_time()
+    results: typing.List[typing.Optional[int]] = []
 
-        return full
+    for string in strings:
+        extractor = TimeExtractor(string, timezone)
+
+        try:
+            if displacement:
+                results.append(extractor.extract_displacement(now))
+            else:
+                results.append(extractor.extract_exact(now))
+
+        except InvalidTime:
+            results.append(None)
+
+    return results